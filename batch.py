@@ -0,0 +1,141 @@
+import os
+import traceback
+from time import time
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from converters import list_conversions, load_settings
+from tracts import load_tracts
+from utils import set_process_threads
+from incremental import run_conversion
+from pipeline import BackgroundWriter, read_ahead
+from config import pipeline_prefetch, pipeline_pending_writes
+
+def convert(conversion, settings=None, windgrid=None, writer=None, entry=None):
+    """ Runs one conversion, catching any error so it does not stop the batch
+
+    Keyword arguments:
+        conversion: tuple -- (converter, input_file, output_file) from converters.list_conversions
+        settings: dict -- settings of the run, see converters.load_settings
+        windgrid: tuple -- the windgrid already read by the reader stage, see pipeline.read_ahead
+        writer: pipeline.BackgroundWriter -- writes the DAT files in the background, None writes them before returning
+        entry: dict -- the manifest entry computed by the reader stage, see pipeline.read_ahead
+
+    Returns:
+        result: dict -- input_file, output_file, status (see incremental.run_conversion), seconds
+            and the error traceback (None if it succeeded)
+    """
+    converter, input_file, output_file = conversion
+    t0 = time()
+    try:
+        status = run_conversion(conversion, settings, windgrid=windgrid, writer=writer, entry=entry)
+        error = None
+    except Exception:
+        status = 'failed'
+        error = traceback.format_exc()
+    return {
+        'input_file': input_file,
+        'output_file': output_file,
+        'status': status,
+        'seconds': time() - t0,
+        'error': error
+    }
+
+def init_worker(threads):
+    """ Prepares a batch worker process - loads the tract cache once and limits the
+    threads each windgrid is converted with, so the workers share the cpus
+
+    Keyword arguments:
+        threads: int -- threads of each worker, see utils.set_process_threads
+    """
+    load_tracts()
+    set_process_threads(threads)
+
+def run_batch(conversions, settings=None):
+    """ Converts many windgrids concurrently in a process pool - each worker
+    loads the tract cache once and reuses it for every file it converts
+
+    Keyword arguments:
+        conversions: list<tuple> -- (converter, input_file, output_file) from converters.list_conversions
+        settings: dict -- settings of the run, batch_workers is the number of worker processes (None uses every cpu)
+
+    Returns:
+        results: list<dict> -- the result of each conversion in the order given
+    """
+    settings = settings or load_settings()
+    workers = settings['batch_workers']
+    # builds the tract cache before any worker needs it
+    load_tracts()
+    if workers == 1 or len(conversions) <= 1:
+        return run_pipeline(conversions, settings)
+    workers = min(workers or os.cpu_count(), len(conversions))
+    threads = settings['tile_workers'] or max(1, os.cpu_count() // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(threads,)) as executor:
+        return list(executor.map(convert, conversions, repeat(settings)))
+
+def run_pipeline(conversions, settings=None, prefetch=pipeline_prefetch, pending_writes=pipeline_pending_writes):
+    """ Converts windgrids one after another as a pipeline of three stages - a reader
+    thread reads and decodes the next windgrids while the current one is converted,
+    and a writer thread writes the DAT files of the ones already converted
+
+    Keyword arguments:
+        conversions: list<tuple> -- (converter, input_file, output_file) from converters.list_conversions
+        settings: dict -- settings of the run, see converters.load_settings
+        prefetch: int -- windgrids read ahead of the one being converted (0 reads each one when it is converted)
+        pending_writes: int -- converted windgrids that may wait to be written (0 writes each one before the next is converted)
+
+    Returns:
+        results: list<dict> -- the result of each conversion in the order given, see convert
+    """
+    settings = settings or load_settings()
+    set_process_threads(settings['tile_workers'])
+    results = []
+    writer = BackgroundWriter(pending_writes) if pending_writes > 0 else None
+    with ThreadPoolExecutor(max_workers=1) as reader:
+        # at most prefetch windgrids are held in memory besides the one being converted
+        reads = [reader.submit(read_ahead, x, settings) for x in conversions[:prefetch]]
+        for index, conversion in enumerate(conversions):
+            if index + prefetch < len(conversions):
+                reads.append(reader.submit(read_ahead, conversions[index + prefetch], settings))
+            try:
+                windgrid, entry = reads.pop(0).result()
+            except Exception:
+                # the converter reads the windgrid again and reports the error
+                windgrid, entry = None, None
+            submitted = len(writer.futures) if writer else 0
+            result = convert(conversion, settings, windgrid=windgrid, writer=writer, entry=entry)
+            result['writes'] = writer.futures[submitted:] if writer else []
+            del windgrid
+            results.append(result)
+    if writer:
+        writer.close()
+    for result in results:
+        # a DAT file that failed to write fails its conversion
+        errors = [x.exception() for x in result.pop('writes') if x.exception() is not None]
+        if errors and result['error'] is None:
+            result['status'] = 'failed'
+            result['error'] = ''.join(traceback.format_exception(errors[0]))
+    return results
+
+def print_summary(results):
+    """ Prints the outcome of each conversion and the totals of a batch
+
+    Keyword arguments:
+        results: list<dict> -- results from run_batch
+    """
+    failed = [x for x in results if x['error'] is not None]
+    for result in results:
+        print(f"{result['status']:9} {result['seconds']:8.2f}s  {result['input_file']} -> {result['output_file']}")
+    for result in failed:
+        print(f"\n{result['input_file']}:\n{result['error']}")
+    skipped = sum(x['status'] == 'skipped' for x in results)
+    print(f'{len(results) - len(failed)} of {len(results)} windgrids converted ({skipped} already up to date)')
+
+def batch_to_dat():
+    """ Creates a Hazus DAT file from every windgrid in the input folder, converting files in parallel
+    """
+    results = run_batch(list_conversions())
+    print_summary(results)
+    return results
+
+if __name__=='__main__':
+    batch_to_dat()
@@ -0,0 +1,291 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from time import perf_counter
+import numpy as np
+
+# synthetic windgrid sizes, point counts for csv-to-dat and shapefile-to-dat and
+# raster widths (the rasters are square) for geotiff-to-dat and arcgrid-to-dat
+scales = {
+    'small': {'points': 10000, 'raster': 1000},
+    'medium': {'points': 250000, 'raster': 5000},
+    'large': {'points': 1000000, 'raster': 10000},
+    'huge': {'points': 5000000, 'raster': 20000},
+}
+
+# extent of the synthetic tracts and windgrids, roughly the gulf and atlantic coasts
+extent = (-98.0, 24.0, -74.0, 40.0)
+
+def make_tracts(count, seed=0):
+    """ Creates a synthetic set of tract polygons - a jittered grid of quadrilaterals
+    that covers the extent without gaps or overlaps, like census tracts
+
+    Keyword arguments:
+        count: int -- approximate number of tracts
+        seed: int -- random seed
+
+    Returns:
+        tracts: geopandas.GeoDataFrame -- tracts in epsg:4326 with a GEOID field
+    """
+    import geopandas as gpd
+    import shapely
+
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = extent
+    columns = int(np.sqrt(count * (maxx - minx) / (maxy - miny)))
+    rows = max(count // columns, 1)
+    xs = np.linspace(minx, maxx, columns + 1)
+    ys = np.linspace(miny, maxy, rows + 1)
+    gx, gy = np.meshgrid(xs, ys)
+    # move the inner vertices so tracts are not all rectangles
+    jitter = 0.3 * min(xs[1] - xs[0], ys[1] - ys[0])
+    gx[1:-1, 1:-1] += rng.uniform(-jitter, jitter, gx[1:-1, 1:-1].shape)
+    gy[1:-1, 1:-1] += rng.uniform(-jitter, jitter, gy[1:-1, 1:-1].shape)
+    corners = np.stack([
+        np.stack([gx[:-1, :-1], gy[:-1, :-1]], axis=-1),
+        np.stack([gx[:-1, 1:], gy[:-1, 1:]], axis=-1),
+        np.stack([gx[1:, 1:], gy[1:, 1:]], axis=-1),
+        np.stack([gx[1:, :-1], gy[1:, :-1]], axis=-1),
+        np.stack([gx[:-1, :-1], gy[:-1, :-1]], axis=-1),
+    ], axis=2).reshape(-1, 5, 2)
+    geometries = shapely.polygons(corners)
+    geoids = np.char.zfill(np.arange(len(geometries)).astype(str), 11)
+    return gpd.GeoDataFrame({'GEOID': geoids}, geometry=geometries, crs='epsg:4326')
+
+def wind_field(x, y):
+    """ Peak gusts in mph of a synthetic hurricane making landfall near the middle
+    of the extent, zero beyond 3 degrees from the track
+    """
+    minx, miny, maxx, maxy = extent
+    track_x = (minx + maxx) / 2 + (y - miny) * 0.3
+    distance = np.abs(x - track_x)
+    radius_of_max_wind = 0.4
+    speed = np.where(
+        distance < radius_of_max_wind,
+        140 * distance / radius_of_max_wind,
+        140 * (radius_of_max_wind / np.maximum(distance, radius_of_max_wind)) ** 0.6
+    )
+    return np.where(distance < 3, speed, 0)
+
+def make_points(count):
+    """ Creates a synthetic windgrid of points on a regular lattice, like an ARA windgrid
+
+    Keyword arguments:
+        count: int -- approximate number of points
+
+    Returns:
+        x, y, z: 1d arrays -- longitudes, latitudes and windspeeds in mph
+    """
+    minx, miny, maxx, maxy = extent
+    columns = int(np.sqrt(count * (maxx - minx) / (maxy - miny)))
+    rows = max(count // columns, 1)
+    x, y = np.meshgrid(np.linspace(minx, maxx, columns), np.linspace(miny, maxy, rows))
+    x, y = x.ravel(), y.ravel()
+    return x, y, wind_field(x, y)
+
+def write_points(directory, name, count):
+    """ Writes a synthetic point windgrid as a .csv, a point Shapefile and a packed .npy
+
+    Returns:
+        files: dict -- file location of the 'csv', 'shapefile' and 'packed' windgrids
+    """
+    import pandas as pd
+    import geopandas as gpd
+    from packed import pack_points
+
+    x, y, z = make_points(count)
+    csv_file = os.path.join(directory, f'{name}.csv')
+    pd.DataFrame({'lon': x, 'lat': y, 'wind_mph': z}).to_csv(csv_file, index=False)
+    shapefile = os.path.join(directory, f'{name}.shp')
+    gpd.GeoDataFrame({'wind_mph': z}, geometry=gpd.points_from_xy(x, y), crs='epsg:4326').to_file(shapefile)
+    packed_file = os.path.join(directory, f'{name}.npy')
+    pack_points(x, y, z, ['wind_mph'], packed_file)
+    return {'csv': csv_file, 'shapefile': shapefile, 'packed': packed_file}
+
+def write_raster(directory, name, width):
+    """ Writes a synthetic windgrid raster as a tiled GeoTIFF and as an ASCII grid
+    without an extension, which is read by the ArcGrid path (GDAL cannot write
+    binary ArcGrids)
+
+    Returns:
+        files: dict -- file location of the 'geotiff' and 'arcgrid' windgrids
+    """
+    import rasterio as rio
+    from rasterio.transform import from_bounds
+
+    minx, miny, maxx, maxy = extent
+    height = int(width * (maxy - miny) / (maxx - minx))
+    transform = from_bounds(minx, miny, maxx, maxy, width, height)
+    files = {
+        'geotiff': (os.path.join(directory, f'{name}.tif'), {'driver': 'GTiff', 'tiled': True, 'blockxsize': 256, 'blockysize': 256}),
+        'arcgrid': (os.path.join(directory, f'{name}_grid'), {'driver': 'AAIGrid'}),
+    }
+    for path, options in files.values():
+        with rio.open(path, 'w', width=width, height=height, count=1, dtype='float32',
+                      crs='epsg:4326', transform=transform, nodata=-9999, **options) as dst:
+            # written in strips so the synthetic raster never has to fit in memory
+            for row in range(0, height, 512):
+                rows = min(512, height - row)
+                cols, lines = np.meshgrid(np.arange(width) + 0.5, np.arange(row, row + rows) + 0.5)
+                x, y = transform * (cols, lines)
+                dst.write(wind_field(x, y).astype('float32'), 1, window=rio.windows.Window(0, row, width, rows))
+    return {key: path for key, (path, options) in files.items()}
+
+def timed(stages, name, function, *args, **kwargs):
+    """ Calls function and records its wall time in stages[name] """
+    t0 = perf_counter()
+    result = function(*args, **kwargs)
+    stages[name] = perf_counter() - t0
+    return result
+
+def benchmark_points(converter, input_file, output_file, settings):
+    """ Times each stage of a point windgrid conversion, then the whole conversion """
+    from readers import read_csv_windgrid, read_shapefile_windgrid
+    from packed import read_packed_windgrid
+    from tracts import load_tracts
+    from utils import convex_hull, calculate_windspeeds_at_centroids, format_dat_rows, write_dat_file
+    # imported up front so the import is not timed as part of a stage
+    import scipy.spatial
+
+    stages = {}
+    if converter == 'csv':
+        x, y, z = timed(stages, 'load', read_csv_windgrid, input_file, settings['latitude_field'], settings['longitude_field'], settings['wind_field'])
+    elif converter == 'shapefile':
+        x, y, z = timed(stages, 'load', read_shapefile_windgrid, input_file, settings['wind_field'])
+    else:
+        x, y, z = timed(stages, 'load', read_packed_windgrid, input_file, settings['wind_field'])
+    tracts = timed(stages, 'load_tracts', load_tracts)
+    xy = np.column_stack([x, y])
+    hull = timed(stages, 'hull', convex_hull, xy)
+    selection = timed(stages, 'tract_selection', tracts.intersecting, hull, convex=True)
+    centroids = tracts.centroids[selection]
+    windspeeds = timed(stages, 'idw', calculate_windspeeds_at_centroids, xy, z, centroids, settings['idw_neighbors'], settings['idw_power'])
+    timed(stages, 'format', format_dat_rows, tracts.geoid[selection], centroids[:, 0], centroids[:, 1], windspeeds)
+    timed(stages, 'write', write_dat_file, output_file, tracts.geoid[selection], centroids[:, 0], centroids[:, 1], windspeeds, settings['dat_header'])
+    return stages, {'points': len(z), 'tracts_selected': len(selection)}
+
+def benchmark_raster(input_file, output_file, settings):
+    """ Times each stage of a raster windgrid conversion, then the whole conversion """
+    import rasterio as rio
+    from raster_utils import select_tracts, calculate_windspeeds_at_tracts
+    from tracts import load_tracts
+    from utils import format_dat_rows, write_dat_file
+
+    stages = {}
+    tracts = timed(stages, 'load_tracts', load_tracts)
+    with timed(stages, 'load', rio.open, input_file) as src:
+        selection = timed(stages, 'tract_selection', select_tracts, src, tracts)
+        geometries = timed(stages, 'load_polygons', tracts.geometries, selection)
+        windspeeds = timed(stages, 'zonal', calculate_windspeeds_at_tracts, src, geometries, method=settings['raster_method'])
+        pixels = src.width * src.height
+    has_wind = windspeeds > 0
+    selection = selection[has_wind]
+    centroids = tracts.centroids[selection]
+    timed(stages, 'format', format_dat_rows, tracts.geoid[selection], centroids[:, 0], centroids[:, 1], windspeeds[has_wind])
+    timed(stages, 'write', write_dat_file, output_file, tracts.geoid[selection], centroids[:, 0], centroids[:, 1], windspeeds[has_wind], settings['dat_header'])
+    return stages, {'pixels': pixels, 'tracts_selected': len(selection)}
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(scale_names=('small',), converters=('csv', 'shapefile', 'packed', 'geotiff', 'arcgrid'), tract_count=70000, repeat=1, workspace=None):
+    """ Runs every converter against synthetic windgrids of each scale, timing each stage
+
+    Keyword arguments:
+        scale_names: tuple<str> -- keys of scales to run
+        converters: tuple<str> -- converters to run
+        tract_count: int -- number of synthetic tracts
+        repeat: int -- runs of each benchmark, the fastest is kept
+        workspace: str -- folder for the synthetic data (default: a temporary folder)
+
+    Returns:
+        report: dict -- environment and the results of each benchmark
+    """
+    from converters import load_settings, csv_file_to_dat, shapefile_file_to_dat, packed_file_to_dat, raster_file_to_dat
+    from tracts import build_tract_cache
+
+    converter_functions = {
+        'csv': csv_file_to_dat, 'shapefile': shapefile_file_to_dat, 'packed': packed_file_to_dat,
+        'geotiff': raster_file_to_dat, 'arcgrid': raster_file_to_dat
+    }
+    temporary = tempfile.TemporaryDirectory() if workspace is None else None
+    workspace = os.path.abspath(workspace or temporary.name)
+    cwd = os.getcwd()
+    results = []
+    try:
+        # the converters read the tract cache relative to the working directory
+        os.chdir(workspace)
+        os.makedirs('output', exist_ok=True)
+        t0 = perf_counter()
+        build_tract_cache(make_tracts(tract_count))
+        print(f'built {tract_count} synthetic tracts in {perf_counter() - t0:.2f}s')
+        settings = load_settings(
+            latitude_field='lat', longitude_field='lon', wind_field='wind_mph',
+            dat_header=['Synthetic benchmark windgrid'], input_dir=workspace, output_dir='output'
+        )
+        for scale in scale_names:
+            files = {}
+            if {'csv', 'shapefile', 'packed'} & set(converters):
+                files.update(write_points(workspace, f'points_{scale}', scales[scale]['points']))
+            if {'geotiff', 'arcgrid'} & set(converters):
+                files.update(write_raster(workspace, f'raster_{scale}', scales[scale]['raster']))
+            for converter in converters:
+                input_file = files[converter]
+                output_file = f'output/{converter}_{scale}'
+                best = None
+                for _ in range(repeat):
+                    if converter in ('csv', 'shapefile', 'packed'):
+                        stages, counts = benchmark_points(converter, input_file, output_file, settings)
+                    else:
+                        stages, counts = benchmark_raster(input_file, output_file, settings)
+                    t0 = perf_counter()
+                    converter_functions[converter](input_file, output_file, settings)
+                    stages['total'] = perf_counter() - t0
+                    if best is None or stages['total'] < best['total']:
+                        best = stages
+                result = {'converter': converter, 'scale': scale, **counts, 'seconds': best}
+                print(f"{converter:10} {scale:7} total {best['total']:8.3f}s  " + '  '.join(f'{k} {v:.3f}' for k, v in best.items() if k != 'total'))
+                results.append(result)
+    finally:
+        os.chdir(cwd)
+        if temporary is not None:
+            temporary.cleanup()
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'tracts': tract_count,
+        'results': results,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Times each stage of every windgrid converter on synthetic windgrids')
+    parser.add_argument('-s', '--scale', action='append', choices=list(scales), help='windgrid scale, repeat for more (default: small)')
+    parser.add_argument('-c', '--converter', action='append', choices=('csv', 'shapefile', 'packed', 'geotiff', 'arcgrid'), help='converter to run, repeat for more (default: all)')
+    parser.add_argument('-t', '--tracts', type=int, default=70000, help='number of synthetic tracts (default: 70000)')
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='runs of each benchmark, the fastest is kept')
+    parser.add_argument('-w', '--workspace', help='folder to keep the synthetic data in (default: a temporary folder)')
+    parser.add_argument('-o', '--output', default='benchmark.json', help='JSON file to write the results to')
+    args = parser.parse_args(argv)
+    report = run_benchmarks(
+        tuple(args.scale or ['small']),
+        tuple(args.converter or ['csv', 'shapefile', 'packed', 'geotiff', 'arcgrid']),
+        args.tracts, args.repeat, args.workspace
+    )
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f'results written to {args.output}')
+
+if __name__=='__main__':
+    main()
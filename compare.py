@@ -0,0 +1,182 @@
+import os
+import numpy as np
+from utils import read_dat_file
+
+def align_dat_files(dat_files):
+    """ Joins DAT files on ident - every file's GEOIDs are placed in the sorted union
+    of all of them with a binary search, so no Python loop runs per tract. Values
+    are rounded to the decimals the DAT file has, so an unrounded sidecar matches its DAT file.
+
+    Keyword arguments:
+        dat_files: list<str> -- file locations of the DAT files, or their compressed copies or sidecars
+
+    Returns:
+        ident: 1d array -- sorted GEOIDs found in any of the files
+        elon, nlat, windspeeds: 2d arrays -- (tracts x files) values of each file, NaN where a file has no such tract
+        dat_headers: list<list<str>> -- the header rows of each file
+    """
+    tables = [read_dat_file(x) for x in dat_files]
+    keys = ident_keys([x[0] for x in tables])
+    for dat_file, file_keys in zip(dat_files, keys):
+        ordered = np.sort(file_keys)
+        if (ordered[1:] == ordered[:-1]).any():
+            raise ValueError(f'{dat_file} has the same tract more than once')
+    all_keys = np.concatenate(keys)
+    union, first = np.unique(all_keys, return_index=True)
+    ident = np.concatenate([x[0] for x in tables])[first]
+    elon, nlat, windspeeds = (np.full((len(ident), len(tables)), np.nan) for _ in range(3))
+    for column, (file_keys, (_, file_elon, file_nlat, file_windspeeds, _)) in enumerate(zip(keys, tables)):
+        rows = np.searchsorted(union, file_keys)
+        elon[rows, column] = np.round(file_elon, 4)
+        nlat[rows, column] = np.round(file_nlat, 4)
+        windspeeds[rows, column] = np.round(file_windspeeds, 5)
+    return ident, elon, nlat, windspeeds, [x[4] for x in tables]
+
+def ident_keys(idents):
+    """ Turns GEOIDs into sort keys - GEOIDs that are all digits of the same width
+    become int64, which sort in the same order far faster than strings
+
+    Keyword arguments:
+        idents: list<1d array> -- GEOIDs of each DAT file
+
+    Returns:
+        keys: list<1d array> -- sort keys of each file's GEOIDs
+    """
+    ident = np.concatenate(idents)
+    if len(ident) == 0:
+        return idents
+    lengths = np.char.str_len(ident)
+    if (lengths == lengths[0]).all() and lengths[0] <= 18 and np.char.isdigit(ident).all():
+        return [x.astype(np.int64) for x in idents]
+    return idents
+
+def summarize_changes(ident, elon, nlat, windspeeds, dat_headers, base=0, other=1, tolerance=0.0):
+    """ Summarizes how one aligned DAT file differs from another, see align_dat_files
+
+    Keyword arguments:
+        ident: 1d array -- sorted GEOIDs
+        elon, nlat, windspeeds: 2d arrays -- (tracts x files) aligned values
+        dat_headers: list<list<str>> -- the header rows of each file
+        base: int -- column of the file compared against
+        other: int -- column of the file compared
+        tolerance: float -- windspeed change in m/s that is not counted as a change
+
+    Returns:
+        summary: dict -- tract counts (tracts, common, added, removed, changed, moved), the largest
+            windspeed change and its tract, the mean change and mean absolute change in m/s over the
+            common tracts, whether the header changed and matches (True when nothing changed)
+    """
+    in_base, in_other = ~np.isnan(windspeeds[:, base]), ~np.isnan(windspeeds[:, other])
+    common = in_base & in_other
+    # rounded to the decimals of the DAT file, which the difference of two of its values can not have more of
+    deltas = np.round(windspeeds[common, other] - windspeeds[common, base], 5)
+    changed = np.abs(deltas) > tolerance
+    moved = (elon[common, other] != elon[common, base]) | (nlat[common, other] != nlat[common, base])
+    largest = int(np.argmax(np.abs(deltas))) if len(deltas) else None
+    summary = {
+        'tracts': int(in_other.sum()),
+        'common': int(common.sum()),
+        'added': int((in_other & ~in_base).sum()),
+        'removed': int((in_base & ~in_other).sum()),
+        'changed': int(changed.sum()),
+        'moved': int(moved.sum()),
+        'max_change': float(deltas[largest]) if largest is not None else 0.0,
+        'max_change_ident': str(ident[common][largest]) if largest is not None else None,
+        'mean_change': float(deltas.mean()) if len(deltas) else 0.0,
+        'mean_abs_change': float(np.abs(deltas).mean()) if len(deltas) else 0.0,
+        'header_changed': dat_headers[other] != dat_headers[base],
+    }
+    summary['matches'] = not (
+        summary['added'] or summary['removed'] or summary['changed'] or summary['moved'] or summary['header_changed']
+    )
+    return summary
+
+def compare_dat_files(dat_files, tolerance=0.0, deltas_file=None):
+    """ Compares DAT files to the first of them, eg. successive advisories of an event
+    or a new conversion against a golden output
+
+    Keyword arguments:
+        dat_files: list<str> -- file locations of the DAT files, the first is the base
+        tolerance: float -- windspeed change in m/s that is not counted as a change
+        deltas_file: str -- file location to write every tract's windspeeds and changes to as .csv, None to skip it
+
+    Returns:
+        summaries: list<dict> -- summary of each file after the first, see summarize_changes,
+            with its base_file and dat_file
+    """
+    if len(dat_files) < 2:
+        raise ValueError('compare needs at least two DAT files')
+    ident, elon, nlat, windspeeds, dat_headers = align_dat_files(dat_files)
+    summaries = []
+    for other in range(1, len(dat_files)):
+        summary = summarize_changes(ident, elon, nlat, windspeeds, dat_headers, other=other, tolerance=tolerance)
+        summaries.append({'base_file': dat_files[0], 'dat_file': dat_files[other], **summary})
+    if deltas_file is not None:
+        write_deltas(deltas_file, ident, windspeeds, dat_files)
+    return summaries
+
+def write_deltas(deltas_file, ident, windspeeds, dat_files):
+    """ Writes every tract's windspeed in each DAT file and its change from the first file as .csv
+
+    Keyword arguments:
+        deltas_file: str -- file location of the .csv
+        ident: 1d array -- sorted GEOIDs
+        windspeeds: 2d array -- (tracts x files) aligned windspeeds, NaN where a file has no such tract
+        dat_files: list<str> -- file locations of the DAT files, named in the column headers
+    """
+    import pandas as pd
+
+    names = [os.path.basename(x) for x in dat_files]
+    columns = {'ident': ident, names[0]: windspeeds[:, 0]}
+    for column, name in enumerate(names[1:], start=1):
+        columns[name] = windspeeds[:, column]
+        columns[f'{name} change'] = windspeeds[:, column] - windspeeds[:, 0]
+    pd.DataFrame(columns).to_csv(deltas_file, index=False, float_format='%.5f')
+
+def compare_folders(base_dir, other_dir, tolerance=0.0):
+    """ Compares every DAT file in a folder to the file of the same name in a base
+    folder - with the base folder holding golden outputs, this is the regression
+    check of a change to the converters
+
+    Keyword arguments:
+        base_dir: str -- folder of the DAT files compared against
+        other_dir: str -- folder of the DAT files compared
+        tolerance: float -- windspeed change in m/s that is not counted as a change
+
+    Returns:
+        summaries: list<dict> -- summary of each DAT file found in either folder, see compare_dat_files -
+            a file missing from one of the folders has only base_file, dat_file and matches (False)
+    """
+    names = sorted(
+        {x for x in os.listdir(base_dir) if x.endswith('.dat')} | {x for x in os.listdir(other_dir) if x.endswith('.dat')}
+    )
+    summaries = []
+    for name in names:
+        base_file, dat_file = os.path.join(base_dir, name), os.path.join(other_dir, name)
+        if os.path.isfile(base_file) and os.path.isfile(dat_file):
+            summaries += compare_dat_files([base_file, dat_file], tolerance=tolerance)
+        else:
+            summaries.append({'base_file': base_file, 'dat_file': dat_file, 'matches': False})
+    return summaries
+
+def print_comparison(summaries):
+    """ Prints the changes found by compare_dat_files or compare_folders
+
+    Keyword arguments:
+        summaries: list<dict> -- summaries to print
+    """
+    for summary in summaries:
+        if 'tracts' not in summary:
+            missing = summary['base_file'] if not os.path.isfile(summary['base_file']) else summary['dat_file']
+            print(f'missing   {missing}')
+            continue
+        print(
+            f"{'same' if summary['matches'] else 'changed':9} {summary['base_file']} -> {summary['dat_file']}: "
+            f"{summary['tracts']} tracts, {summary['added']} added, {summary['removed']} removed, "
+            f"{summary['changed']} changed (max {summary['max_change']:+.5f} m/s at {summary['max_change_ident']}, "
+            f"mean {summary['mean_change']:+.5f}, mean absolute {summary['mean_abs_change']:.5f})"
+            + (f", {summary['moved']} moved" if summary['moved'] else '')
+            + (', header changed' if summary['header_changed'] else '')
+        )
+    same = sum(x['matches'] for x in summaries)
+    print(f'{same} of {len(summaries)} DAT files unchanged')
\ No newline at end of file
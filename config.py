@@ -6,11 +6,95 @@ dat_header = [
     'Swath domain provided by FEMA'
 ]
 
+# also write each .dat file compressed, as <name>.dat.gz ('gzip') or <name>.dat.zst ('zstd', needs pyarrow)
+dat_compression = None
+# also write the columns of each .dat file to <name>.dat.parquet ('parquet', needs pyarrow) or <name>.dat.npz ('npz'),
+# which are read back without parsing text (None turns either off)
+dat_sidecar = None
+
 # configure the field names (applicable for: csv-to-dat and shapefile-to-dat)
 latitude_field = 'Lat'
 longitude_field = 'lon'
+# wind_field can also be a list of fields or a glob pattern like 'member_*' to write a .dat file per field
 wind_field = 'vg_mph'
 
+# configure the inverse distance weighting (applicable for: csv-to-dat and shapefile-to-dat)
+# each tract centroid is weighted by 1 / distance ** idw_power over its idw_neighbors nearest points
+idw_neighbors = 12
+idw_power = 1
+# only points within idw_max_distance degrees of a centroid are weighted, so tracts far from every point
+# are left out of the .dat file instead of taking the wind of distant points (None turns it off) -
+# with a distance, idw_neighbors = None weights every point within it (degrees of arc unless idw_distance is 'degrees')
+idw_max_distance = None
+# how tract windspeeds are interpolated from the points
+# 'idw' - inverse distance weighting as above
+# 'nearest' - value of the point nearest each tract centroid
+# 'bilinear' - value interpolated between the four points around each tract centroid, for windgrids on a
+#   regular lattice (tracts off the lattice and other windgrids fall back to inverse distance weighting)
+# windgrids on a regular lattice, as ARA grids usually are, find the points of 'nearest' and 'bilinear' without a tree search
+interpolation = 'idw'
+# how distances between points and tract centroids are measured
+# 'degrees' - straight lines in longitude, latitude, which stretches east-west distances away from the equator
+# 'sphere' - chords between points on a unit sphere, true to great circle distances everywhere
+# 'projected' - straight lines in idw_crs (the conus albers equal area default is distorted outside the lower 48)
+# the tract centroids are transformed once and kept in the tract cache, each run only transforms the windgrid points
+idw_distance = 'degrees'
+idw_crs = 'epsg:5070'
+# folder to keep the tract selection and weights of each windgrid's point lattice in (None turns it off)
+# later windgrids on exactly the same points, like ensemble members or advisories, reuse them
+idw_weight_cache = None
+
+# configure how tract windspeeds are taken from a raster (applicable for: geotiff-to-dat and arcgrid-to-dat)
+# 'zonal' - mean of each tract's bounding window with the pixels outside the tract counted as 0, all tracts in
+#   one pass over the raster - the windspeeds of earlier versions
+# 'zonal_inside' - mean of only the pixels inside each tract, also in one pass - higher than 'zonal' for every tract
+#   that does not fill its bounding window
+# 'mask' - the same means as 'zonal' by masking and cropping the raster once per tract (slow)
+# 'nearest' - value of the pixel under each tract centroid (fastest)
+# 'bilinear' - value interpolated between the four pixel centers nearest each tract centroid
+# 'nearest' and 'bilinear' read no polygons only with tract_selection = 'centroid' - 'polygon' selection
+# still decodes the polygon of every tract the raster might cover
+raster_method = 'zonal'
+# bands to convert to a .dat file each, eg. [1, 2, 3] or 'all' (None converts the first band to a single .dat file)
+raster_bands = None
+# rasters are read in windows of about this many pixels, which bounds the memory used per raster
+raster_block_pixels = 4194304
+
+# which tracts a windgrid covers (applicable for: all scripts)
+# 'polygon' - tracts whose polygon touches the windgrid's points hull or nonzero pixels
+# 'centroid' - tracts whose centroid is inside them, like the Hazus syTract centroids
+tract_selection = 'polygon'
+
+# number of threads that split one windgrid into spatial tiles and query its neighbors (None uses every cpu,
+# shared between the batch_workers processes, 1 turns tiling off)
+# windgrids with fewer tracts than tile_min_locations are not split
+tile_workers = None
+tile_min_locations = 20000
+
+# number of windgrids converted at the same time by batch.py (None uses every cpu)
+batch_workers = None
+# windgrids converted one at a time are pipelined - the next pipeline_prefetch windgrids are read while
+# one is converted, and up to pipeline_pending_writes converted windgrids wait to be written in the background
+# (0 turns either stage off)
+pipeline_prefetch = 1
+pipeline_pending_writes = 2
+
+# watch.py checks the input folder every watch_interval seconds and converts a windgrid
+# once its files have not changed for watch_settle seconds
+watch_interval = 5
+watch_settle = 10
+
+# profile writes <name>.profile.json next to each .dat file with the wall time, cpu time and
+# peak memory of every stage and the points, tracts and pixels handled
+# cprofile also writes a <name>.prof cProfile dump there (open it with pstats or snakeviz)
+profile = False
+cprofile = False
+
+# skip windgrids whose contents, settings and tracts have not changed since their .dat file was written
+# (a header change only rewrites the file) - the record of each run is kept in the output folder's .windgrid-cache
+incremental = True
+
 # NOT RECOMMENDED TO UPDATE - input/output directories
 input_dir = 'input'
-output_dir = 'output'
\ No newline at end of file
+output_dir = 'output'
+packed_dir = 'packed'
\ No newline at end of file
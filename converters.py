@@ -0,0 +1,270 @@
+import os
+import json
+import config
+from profiling import run_profile
+
+csv_extensions = ('.csv', '.xls', '.xlsx', '.xlsm', '.xlsb', '.odf', '.ods', '.odt')
+shapefile_extensions = ('.shp',)
+geotiff_extensions = ('.tif',)
+packed_extensions = ('.npy',)
+formats = ('csv', 'shapefile', 'geotiff', 'arcgrid', 'packed')
+
+# config.py variables that can be changed for a single run
+setting_names = (
+    'dat_header', 'dat_compression', 'dat_sidecar', 'latitude_field', 'longitude_field', 'wind_field',
+    'idw_neighbors', 'idw_power', 'idw_max_distance', 'interpolation', 'idw_distance', 'idw_crs', 'idw_weight_cache',
+    'raster_method', 'raster_bands', 'tract_selection', 'input_dir', 'output_dir', 'batch_workers', 'tile_workers',
+    'profile', 'cprofile', 'incremental'
+)
+
+def load_settings(config_file=None, **overrides):
+    """ Collects the settings of one run - the config.py values, replaced by any
+    found in a JSON config file and then by any overrides that are not None
+
+    Keyword arguments:
+        config_file: str -- file location of a JSON object of config.py variable names and values
+        overrides: -- config.py variable names and values
+
+    Returns:
+        settings: dict -- the value of every name in setting_names
+    """
+    settings = {name: getattr(config, name) for name in setting_names}
+    if config_file is not None:
+        with open(config_file) as file:
+            settings.update(json.load(file))
+    settings.update({name: value for name, value in overrides.items() if value is not None})
+    unknown = set(settings) - set(setting_names)
+    if unknown:
+        raise ValueError(f"unknown settings: {', '.join(sorted(unknown))}")
+    return settings
+
+def dat_writer(settings):
+    """ Writes DAT files with the compression and sidecar of a run, called like utils.write_dat_files
+
+    Keyword arguments:
+        settings: dict -- settings of the run, see load_settings
+
+    Returns:
+        writer: function -- utils.write_dat_files with the run's dat_compression and dat_sidecar
+    """
+    from functools import partial
+    from utils import write_dat_files
+
+    return partial(write_dat_files, compression=settings['dat_compression'], sidecar=settings['dat_sidecar'])
+
+def read_csv_file(input_file, settings):
+    """ Reads the points of a windgrid .csv or excel file for point_windgrid_to_dat, see read_point_windgrid """
+    from readers import read_csv_windgrid, csv_columns
+
+    def read_windgrid(wind_field):
+        return read_csv_windgrid(input_file, settings['latitude_field'], settings['longitude_field'], wind_field)
+    return read_point_windgrid(input_file, settings, read_windgrid, csv_columns)
+
+def read_shapefile_file(input_file, settings):
+    """ Reads the points of a windgrid Shapefile for point_windgrid_to_dat, see read_point_windgrid """
+    from readers import read_shapefile_windgrid, shapefile_columns
+
+    def read_windgrid(wind_field):
+        return read_shapefile_windgrid(input_file, wind_field)
+    return read_point_windgrid(input_file, settings, read_windgrid, shapefile_columns)
+
+def read_packed_file(input_file, settings):
+    """ Reads the points of a packed windgrid (.npy) for point_windgrid_to_dat, see read_point_windgrid """
+    from packed import read_packed_windgrid, packed_columns
+
+    def read_windgrid(wind_field):
+        return read_packed_windgrid(input_file, wind_field)
+    return read_point_windgrid(input_file, settings, read_windgrid, packed_columns)
+
+def read_point_windgrid(input_file, settings, read_windgrid, windgrid_columns):
+    """ Reads the points of a windgrid and the wind fields they hold
+
+    Keyword arguments:
+        input_file: str -- file location of the windgrid
+        settings: dict -- settings of the run, see load_settings
+        read_windgrid: function -- reads x, y, z given the wind field or list of wind fields
+        windgrid_columns: function -- reads the field names of the windgrid given its file location
+
+    Returns:
+        windgrid: tuple -- (wind_field, x, y, z), wind_field is a list of the matching fields when
+            settings['wind_field'] names many and z is then 2d (points x fields)
+    """
+    from readers import is_multi_field, match_fields
+
+    wind_field = settings['wind_field']
+    if is_multi_field(wind_field):
+        wind_field = match_fields(windgrid_columns(input_file), wind_field)
+    x, y, z = read_windgrid(wind_field)
+    return wind_field, x, y, z
+
+def csv_file_to_dat(input_file, output_file, settings=None, windgrid=None, defer=None):
+    """ Creates Hazus DAT files from a windgrid .csv or excel file, see point_windgrid_to_dat """
+    return point_windgrid_to_dat(input_file, output_file, settings or load_settings(), read_csv_file, windgrid, defer)
+
+def shapefile_file_to_dat(input_file, output_file, settings=None, windgrid=None, defer=None):
+    """ Creates Hazus DAT files from a windgrid point or polygon Shapefile, see point_windgrid_to_dat """
+    return point_windgrid_to_dat(input_file, output_file, settings or load_settings(), read_shapefile_file, windgrid, defer)
+
+def packed_file_to_dat(input_file, output_file, settings=None, windgrid=None, defer=None):
+    """ Creates Hazus DAT files from a packed point windgrid (.npy), see packed.pack_windgrid and point_windgrid_to_dat """
+    return point_windgrid_to_dat(input_file, output_file, settings or load_settings(), read_packed_file, windgrid, defer)
+
+def point_windgrid_to_dat(input_file, output_file, settings, read_file, windgrid=None, defer=None):
+    """ Creates a Hazus DAT file containing windspeeds in m/s from a point windgrid, for the point converters -
+    a list or glob pattern of wind fields writes a DAT file per field, <output_file>_<field>.dat
+
+    Keyword arguments:
+        input_file: str -- file location of the windgrid
+        output_file: str -- file location and name of output DAT file
+        settings: dict -- settings of the run, see load_settings
+        read_file: function -- reads the windgrid given its file location and the settings, see read_point_windgrid
+        windgrid: tuple -- the windgrid already read by read_file and the stage that timed it, see pipeline.read_ahead (None to read it)
+        defer: function -- defer(function, *args) runs the writes of the DAT files later, eg. pipeline.BackgroundWriter.submit
+            (None writes them before returning)
+
+    Returns:
+        tracts_selection: 1d array -- cache positions of the tracts written
+        windspeeds: 1d array -- windspeeds in m/s of the tracts written, 2d with a column per DAT file when there are many
+        output_files: list<str> -- the DAT files written
+    """
+    from utils import points_to_dat, field_output_files
+
+    with run_profile(input_file, output_file, settings, defer=defer) as profile:
+        # read input file, unless the pipeline read it ahead and timed the read
+        if windgrid is not None:
+            (wind_field, x, y, z), read_stage = windgrid
+            profile.add_stage(read_stage)
+        else:
+            with profile.stage('read'):
+                wind_field, x, y, z = read_file(input_file, settings)
+        output_files = [output_file] if isinstance(wind_field, str) else field_output_files(output_file, wind_field)
+        # generate .dat file
+        tracts_selection, windspeeds = points_to_dat(
+            x, y, z, output_files if z.ndim == 2 else output_file, dat_header=settings['dat_header'],
+            neighbors=settings['idw_neighbors'], power=settings['idw_power'],
+            weight_cache=settings['idw_weight_cache'], selection=settings['tract_selection'], profile=profile,
+            writer=dat_writer(settings), defer=defer, method=settings['interpolation'], max_distance=settings['idw_max_distance'],
+            distance=settings['idw_distance'], crs=settings['idw_crs']
+        )
+    return tracts_selection, windspeeds, output_files
+
+def raster_file_to_dat(input_file, output_file, settings=None, windgrid=None, defer=None):
+    """ Creates a Hazus DAT file containing windspeeds in m/s from a windgrid GeoTIFF or ArcGrid -
+    with raster_bands set, a DAT file is written per band, <output_file>_band<number>.dat
+
+    Keyword arguments:
+        input_file: str -- file location of the windgrid
+        output_file: str -- file location and name of output DAT file
+        settings: dict -- settings of the run, see load_settings
+        windgrid: tuple -- (None, stage that timed reading the files into the OS cache) from pipeline.read_ahead,
+            a raster is read a window at a time while it is converted
+        defer: function -- defer(function, *args) runs the writes of the DAT files later, eg. pipeline.BackgroundWriter.submit
+            (None writes them before returning)
+
+    Returns:
+        tracts_selection: 1d array -- cache positions of the tracts written
+        windspeeds: 1d array -- windspeeds in m/s of the tracts written, 2d with a column per DAT file when there are many
+        output_files: list<str> -- the DAT files written
+    """
+    from raster_utils import raster_to_dat, raster_bands
+    from tracts import load_tracts
+    from utils import field_output_files
+
+    settings = settings or load_settings()
+    bands, output_files = raster_bands(input_file, settings['raster_bands']), [output_file]
+    if bands is not None:
+        output_files = field_output_files(output_file, [f'band{x}' for x in bands])
+    with run_profile(input_file, output_file, settings, defer=defer) as profile:
+        if windgrid is not None:
+            profile.add_stage(windgrid[1])
+        with profile.stage('load_tracts'):
+            tracts = load_tracts()
+        tracts_selection, windspeeds = raster_to_dat(
+            input_file, tracts, output_files if bands is not None else output_file, dat_header=settings['dat_header'],
+            method=settings['raster_method'], bands=bands, selection=settings['tract_selection'], profile=profile,
+            writer=dat_writer(settings), defer=defer
+        )
+    return tracts_selection, windspeeds, output_files
+
+def windgrid_files(input_file):
+    """ Lists the files a windgrid is made of - a Shapefile includes its sidecar
+    files and an ArcGrid every file in its folder
+
+    Keyword arguments:
+        input_file: str -- file location of the windgrid
+
+    Returns:
+        files: list<str> -- file locations, None if an ArcGrid folder has no hdr.adf yet
+    """
+    if os.path.isdir(input_file):
+        if not os.path.isfile(os.path.join(input_file, 'hdr.adf')):
+            return None
+        return [os.path.join(input_file, x) for x in sorted(os.listdir(input_file))]
+    elif input_file.endswith('.shp'):
+        stem = input_file[:-len('.shp')]
+        return [input_file, f'{stem}.shx', f'{stem}.dbf']
+    return [input_file]
+
+def file_signature(input_file):
+    """ Summarizes the size and modification time of every file of a windgrid
+
+    Keyword arguments:
+        input_file: str -- file location of the windgrid
+
+    Returns:
+        signature: tuple -- changes whenever the windgrid changes, None if it is incomplete
+    """
+    files = windgrid_files(input_file)
+    if files is None:
+        return None
+    signature = []
+    for file in files:
+        try:
+            stat = os.stat(file)
+        except FileNotFoundError:
+            return None
+        signature.append((stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+def detect_conversion(input_file, output_dir, formats=formats):
+    """ Chooses the converter of a windgrid from its name
+
+    Keyword arguments:
+        input_file: str -- file location of the windgrid
+        output_dir: str -- directory to write the DAT file to
+        formats: tuple<str> -- windgrid formats to consider
+
+    Returns:
+        conversion: tuple -- (converter, input_file, output_file), or None if the format is not supported
+    """
+    name = os.path.basename(os.path.normpath(input_file))
+    stem = '.'.join(name.split('.')[0:-1])
+    if 'csv' in formats and name.endswith(csv_extensions):
+        return (csv_file_to_dat, input_file, f'{output_dir}/{stem}')
+    elif 'shapefile' in formats and name.endswith(shapefile_extensions):
+        return (shapefile_file_to_dat, input_file, f'{output_dir}/{stem}')
+    elif 'packed' in formats and name.endswith(packed_extensions):
+        return (packed_file_to_dat, input_file, f'{output_dir}/{stem}')
+    elif 'geotiff' in formats and name.endswith(geotiff_extensions):
+        return (raster_file_to_dat, input_file, f'{output_dir}/{name}.dat')
+    elif 'arcgrid' in formats and '.' not in name:
+        return (raster_file_to_dat, input_file, f'{output_dir}/{name}.dat')
+    return None
+
+def list_conversions(formats=formats, input_dir=config.input_dir, output_dir=config.output_dir):
+    """ Lists the windgrids in the input directory and how to convert each of them
+
+    Keyword arguments:
+        formats: tuple<str> -- windgrid formats to include
+        input_dir: str -- directory holding the windgrids
+        output_dir: str -- directory to write the DAT files to
+
+    Returns:
+        conversions: list<tuple> -- (converter, input_file, output_file) of each windgrid
+    """
+    conversions = []
+    for name in sorted(os.listdir(input_dir)):
+        conversion = detect_conversion(f'{input_dir}/{name}', output_dir, formats)
+        if conversion is not None:
+            conversions.append(conversion)
+    return conversions
@@ -0,0 +1,251 @@
+import os
+import json
+import hashlib
+import numpy as np
+from converters import load_settings, windgrid_files, file_signature, dat_writer
+from tracts import load_tracts
+from utils import dat_file, replace_atomically
+
+cache_folder = '.windgrid-cache'
+# bump when a change to the converters changes the tracts or windspeeds they produce
+products_version = 3
+
+# settings each converter's tracts and windspeeds depend on, the header only changes the written file
+product_setting_names = {
+    'csv_file_to_dat': ('latitude_field', 'longitude_field', 'wind_field', 'idw_neighbors', 'idw_power', 'idw_max_distance', 'interpolation', 'idw_distance', 'idw_crs', 'tract_selection'),
+    'shapefile_file_to_dat': ('wind_field', 'idw_neighbors', 'idw_power', 'idw_max_distance', 'interpolation', 'idw_distance', 'idw_crs', 'tract_selection'),
+    'packed_file_to_dat': ('wind_field', 'idw_neighbors', 'idw_power', 'idw_max_distance', 'interpolation', 'idw_distance', 'idw_crs', 'tract_selection'),
+    'raster_file_to_dat': ('raster_method', 'raster_bands', 'tract_selection'),
+}
+
+def content_hash(input_file):
+    """ Hashes the contents of every file of a windgrid
+
+    Keyword arguments:
+        input_file: str -- file location of the windgrid
+
+    Returns:
+        digest: str -- sha256 hex digest of the file names and contents
+    """
+    files = windgrid_files(input_file)
+    if files is None:
+        raise ValueError(f'{input_file} is not a complete ArcGrid - its folder has no hdr.adf')
+    digest = hashlib.sha256()
+    for file in files:
+        digest.update(os.path.basename(file).encode())
+        with open(file, 'rb') as windgrid:
+            for block in iter(lambda: windgrid.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def hash_key(values):
+    """ Hashes a JSON serializable dict into a cache key """
+    return hashlib.sha256(json.dumps(values, sort_keys=True).encode()).hexdigest()
+
+def manifest_file(output_file):
+    """ Locates the manifest entry of a DAT file - the cache folder next to it holds one per DAT file """
+    folder, name = os.path.split(dat_file(output_file))
+    return os.path.join(folder, cache_folder, f'{name}.json')
+
+def products_file(output_file, products_key):
+    """ Locates the cached tracts and windspeeds of a conversion """
+    return os.path.join(os.path.dirname(dat_file(output_file)), cache_folder, f'{products_key}.npz')
+
+def read_manifest(output_file):
+    """ Reads the manifest entry of a DAT file, empty if it has none """
+    try:
+        with open(manifest_file(output_file)) as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def write_manifest(output_file, entry):
+    """ Replaces the manifest entry of a DAT file """
+    path = manifest_file(output_file)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(temporary_file):
+        with open(temporary_file, 'w') as file:
+            json.dump(entry, file, indent=2)
+
+    replace_atomically(path, write)
+
+def manifest_entry(conversion, settings, previous, tracts):
+    """ Builds the manifest entry a conversion would have with the current windgrid, settings and tracts
+
+    Keyword arguments:
+        conversion: tuple -- (converter, input_file, output_file) from converters.list_conversions
+        settings: dict -- settings of the run, see converters.load_settings
+        previous: dict -- the DAT file's manifest entry, see read_manifest
+        tracts: TractIndex -- see tracts.load_tracts
+
+    Returns:
+        entry: dict -- the manifest entry, without the output files
+    """
+    converter, input_file, output_file = conversion
+    # the contents are only hashed again when a file's size or modification time changed
+    signature = json.loads(json.dumps(file_signature(input_file)))
+    if previous.get('signature') == signature and previous.get('input_file') == input_file:
+        input_hash = previous['input_hash']
+    else:
+        input_hash = content_hash(input_file)
+    names = product_setting_names.get(converter.__name__, sorted(settings))
+    products_key = hash_key({
+        'converter': converter.__name__,
+        'version': products_version,
+        'input_hash': input_hash,
+        'settings': {name: settings[name] for name in names},
+        'tracts_version': tracts.version,
+    })
+    return {
+        'input_file': input_file,
+        'signature': signature,
+        'input_hash': input_hash,
+        'tracts_version': tracts.version,
+        'products_key': products_key,
+        'output_key': hash_key({
+            'products_key': products_key, 'dat_header': settings['dat_header'],
+            'dat_compression': settings['dat_compression'], 'dat_sidecar': settings['dat_sidecar']
+        }),
+    }
+
+def is_up_to_date(conversion, settings=None):
+    """ Tests whether convert_incremental would skip a conversion
+
+    Keyword arguments:
+        conversion: tuple -- (converter, input_file, output_file) from converters.list_conversions
+        settings: dict -- settings of the run, see converters.load_settings
+
+    Returns:
+        up_to_date: bool -- True if the DAT files match the windgrid, settings and tracts
+    """
+    output_file = conversion[2]
+    previous = read_manifest(output_file)
+    entry = manifest_entry(conversion, settings or load_settings(), previous, load_tracts())
+    return is_current(output_file, entry, previous)
+
+def is_current(output_file, entry, previous):
+    """ Tests whether the DAT files of a previous manifest entry are all still there and
+    were written from the same products and header as a new entry, see manifest_entry
+    """
+    previous_outputs = previous.get('output_files', [])
+    return bool(
+        previous.get('output_key') == entry['output_key'] and os.path.isfile(products_file(output_file, entry['products_key'])) and
+        previous_outputs and all(os.path.isfile(dat_file(x)) for x in previous_outputs)
+    )
+
+def convert_incremental(conversion, settings=None, windgrid=None, writer=None, entry=None):
+    """ Runs a conversion only as far as its inputs have changed since the last
+    run - the DAT file is kept when the windgrid contents, settings and tracts
+    all match its manifest entry, and is rewritten from the cached tracts and
+    windspeeds when only the header changed
+
+    Keyword arguments:
+        conversion: tuple -- (converter, input_file, output_file) from converters.list_conversions
+        settings: dict -- settings of the run, see converters.load_settings
+        windgrid: tuple -- the windgrid already read by the reader stage, see pipeline.read_ahead
+        writer: pipeline.BackgroundWriter -- writes the DAT files and then the manifest entry
+            in the background, None writes them before returning
+        entry: dict -- the manifest entry already built by the reader stage, so the windgrid
+            is not hashed again (None builds it), see manifest_entry
+
+    Returns:
+        status: str -- 'skipped', 'rewritten' or 'converted'
+    """
+    converter, input_file, output_file = conversion
+    settings = settings or load_settings()
+    tracts = load_tracts()
+    previous = read_manifest(output_file)
+    entry = dict(entry) if entry is not None else manifest_entry(conversion, settings, previous, tracts)
+    products_key = entry['products_key']
+    products = products_file(output_file, products_key)
+    if is_current(output_file, entry, previous):
+        entry['output_files'] = previous['output_files']
+        if previous != entry:
+            write_manifest(output_file, entry)
+        return 'skipped'
+
+    # with a background writer the DAT files (and the profile) are written after the conversion returns
+    deferred = []
+    defer = None if writer is None else lambda function, *args: deferred.append((function, args))
+    if os.path.isfile(products):
+        with np.load(products) as cached:
+            tracts_selection, windspeeds = cached['tracts'], cached['windspeeds']
+            output_files = cached['output_files'].tolist()
+        centroids = tracts.centroids[tracts_selection]
+        args = (output_files, tracts.geoid[tracts_selection], centroids[:, 0], centroids[:, 1], windspeeds, settings['dat_header'])
+        if defer is None:
+            dat_writer(settings)(*args)
+        else:
+            defer(dat_writer(settings), *args)
+        status = 'rewritten'
+    else:
+        tracts_selection, windspeeds, output_files = converter(input_file, output_file, settings, windgrid=windgrid, defer=defer)
+        status = 'converted'
+    entry['output_files'] = output_files
+
+    def finish():
+        # every deferred call runs, so the profile is written even after a failed write
+        errors = []
+        for function, args in deferred:
+            try:
+                function(*args)
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+        if status == 'converted':
+            os.makedirs(os.path.dirname(products), exist_ok=True)
+
+            def write(temporary_file):
+                with open(temporary_file, 'wb') as file:
+                    np.savez(
+                        file, tracts=tracts_selection, windspeeds=windspeeds,
+                        output_files=np.asarray(output_files, dtype=str)
+                    )
+
+            replace_atomically(products, write)
+        if previous.get('products_key') != products_key:
+            forget(output_file)
+        # written last, so the manifest never lists DAT files that failed to write
+        write_manifest(output_file, entry)
+
+    if writer is None:
+        finish()
+    else:
+        writer.submit(finish)
+    return status
+
+def forget(output_file):
+    """ Removes the manifest entry of a DAT file and its cached tracts and windspeeds """
+    previous = read_manifest(output_file)
+    files = [manifest_file(output_file)]
+    if 'products_key' in previous:
+        files.append(products_file(output_file, previous['products_key']))
+    for file in files:
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            pass
+
+def run_conversion(conversion, settings=None, windgrid=None, writer=None, entry=None):
+    """ Runs a conversion, incrementally if settings['incremental'] is set
+
+    Keyword arguments:
+        conversion: tuple -- (converter, input_file, output_file) from converters.list_conversions
+        settings: dict -- settings of the run, see converters.load_settings
+        windgrid: tuple -- the windgrid already read by the reader stage, see pipeline.read_ahead
+        writer: pipeline.BackgroundWriter -- writes the DAT files in the background, None writes them before returning
+        entry: dict -- the manifest entry built by the reader stage, see convert_incremental
+
+    Returns:
+        status: str -- 'skipped', 'rewritten' or 'converted', see convert_incremental
+    """
+    settings = settings or load_settings()
+    if settings['incremental']:
+        return convert_incremental(conversion, settings, windgrid=windgrid, writer=writer, entry=entry)
+    converter, input_file, output_file = conversion
+    # the DAT file written may no longer match its manifest entry
+    forget(output_file)
+    converter(input_file, output_file, settings, windgrid=windgrid, defer=None if writer is None else writer.submit)
+    return 'converted'
\ No newline at end of file
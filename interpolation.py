@@ -0,0 +1,289 @@
+import numpy as np
+from config import interpolation, idw_neighbors, idw_power, idw_max_distance, idw_distance, idw_crs
+
+# a lattice may have at most this many nodes per point, so a windgrid clipped to a swath still counts
+lattice_max_nodes_per_point = 4
+# mean earth radius in meters, converts idw_max_distance to the units of a projected crs
+earth_radius = 6371008.8
+distance_spaces = ('degrees', 'sphere', 'projected')
+
+def search_coordinates(xy, distance=idw_distance, crs=idw_crs):
+    """ Transforms longitude, latitude points to the coordinates neighbor distances are measured in
+
+    Keyword arguments:
+        xy: 2d array -- longitudes and latitudes as the columns
+        distance: str -- 'degrees', 'sphere' or 'projected', see idw_distance in config.py
+        crs: str -- projected crs of 'projected' distances, eg. 'epsg:5070'
+
+    Returns:
+        coordinates: 2d array -- xy for 'degrees', x, y, z on the unit sphere for 'sphere' or x, y in crs units for 'projected'
+    """
+    xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+    if distance == 'degrees':
+        return xy
+    if distance == 'sphere':
+        lon, lat = np.radians(xy[:, 0]), np.radians(xy[:, 1])
+        return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+    if distance == 'projected':
+        from pyproj import Transformer
+
+        transformer = Transformer.from_crs('epsg:4326', crs, always_xy=True)
+        return np.column_stack(transformer.transform(xy[:, 0], xy[:, 1]))
+    raise ValueError(f"unknown idw_distance '{distance}' - use {', '.join(repr(x) for x in distance_spaces)}")
+
+def search_distance(max_distance, distance=idw_distance):
+    """ Converts idw_max_distance from degrees of arc to the units of search_coordinates
+
+    Keyword arguments:
+        max_distance: float -- distance in degrees, None for no limit
+        distance: str -- 'degrees', 'sphere' or 'projected', see idw_distance in config.py
+
+    Returns:
+        max_distance: float -- the distance in degrees, as a chord of the unit sphere or in meters
+    """
+    if max_distance is None or distance == 'degrees':
+        return max_distance
+    if distance == 'sphere':
+        return 2 * np.sin(np.radians(max_distance) / 2)
+    return np.radians(max_distance) * earth_radius
+
+def lattice_axis(values):
+    """ Fits evenly spaced nodes to the distinct coordinates of one axis
+
+    Keyword arguments:
+        values: 1d array -- sorted distinct coordinates
+
+    Returns:
+        axis: tuple -- (first node, spacing, number of nodes), None if the coordinates are not evenly spaced
+    """
+    if len(values) < 2:
+        return None
+    span = values[-1] - values[0]
+    steps = int(np.rint(span / np.median(np.diff(values))))
+    if steps < 1:
+        return None
+    spacing = span / steps
+    offsets = (values - values[0]) / spacing
+    # coordinates parsed from text are a few ulps off their node
+    if np.abs(offsets - np.rint(offsets)).max() > 1e-6:
+        return None
+    return values[0], spacing, steps + 1
+
+def detect_lattice(xy, max_nodes_per_point=lattice_max_nodes_per_point):
+    """ Detects whether windgrid points lie on a regular, axis aligned lattice, as ARA
+    grids do - nodes may be missing, eg. where a grid is clipped to the swath
+
+    Keyword arguments:
+        xy: 2d array -- x and y coordinates of the windgrid points as the columns
+        max_nodes_per_point: int -- largest number of lattice nodes per point, sparser points are not a lattice
+
+    Returns:
+        lattice: tuple -- (origin, spacing, nodes) where origin and spacing are the (x, y) of the
+            first node and between nodes and nodes is a 2d (rows x columns) array of the point at
+            each node (-1 where there is none), None if the points are not a lattice
+    """
+    axes = [lattice_axis(np.unique(xy[:, axis])) for axis in (0, 1)]
+    if None in axes:
+        return None
+    (x0, dx, columns), (y0, dy, rows) = axes
+    if columns * rows > max_nodes_per_point * len(xy):
+        return None
+    column = np.rint((xy[:, 0] - x0) / dx).astype('int64')
+    row = np.rint((xy[:, 1] - y0) / dy).astype('int64')
+    nodes = np.full((rows, columns), -1, dtype='int64')
+    nodes[row, column] = np.arange(len(xy))
+    # two points on one node
+    if np.count_nonzero(nodes >= 0) != len(xy):
+        return None
+    return (x0, y0), (dx, dy), nodes
+
+def lattice_entries(lattice, centroids, method):
+    """ Weights the lattice nodes around each centroid with index arithmetic instead of a tree query
+
+    Keyword arguments:
+        lattice: tuple -- see detect_lattice
+        centroids: 2d array -- x and y coordinates of the tract centroids as the columns
+        method: str -- 'nearest' for the node nearest each centroid, 'bilinear' for the four nodes around it
+
+    Returns:
+        rows, points, weights: 1d arrays -- the centroid, point and weight of each nonzero weight
+        located: 1d array -- True for the centroids weighted, the others are outside the lattice
+            or next to a missing node
+    """
+    (x0, y0), (dx, dy), nodes = lattice
+    node_rows, node_columns = nodes.shape
+    column = (centroids[:, 0] - x0) / dx
+    row = (centroids[:, 1] - y0) / dy
+    inside = (column >= 0) & (column <= node_columns - 1) & (row >= 0) & (row <= node_rows - 1)
+    if method == 'nearest':
+        corners = [(np.rint(row).astype('int64'), np.rint(column).astype('int64'), np.ones(len(centroids)))]
+    else:
+        # the last row or column of nodes is the far corner of the cell before it
+        row0 = np.clip(np.floor(row), 0, max(node_rows - 2, 0)).astype('int64')
+        column0 = np.clip(np.floor(column), 0, max(node_columns - 2, 0)).astype('int64')
+        t, u = column - column0, row - row0
+        corners = [
+            (row0, column0, (1 - t) * (1 - u)), (row0, column0 + 1, t * (1 - u)),
+            (row0 + 1, column0, (1 - t) * u), (row0 + 1, column0 + 1, t * u)
+        ]
+    located = inside.copy()
+    points = []
+    for corner_row, corner_column, weight in corners:
+        point = np.full(len(centroids), -1)
+        valid = inside & (corner_row < node_rows) & (corner_column < node_columns)
+        point[valid] = nodes[corner_row[valid], corner_column[valid]]
+        located &= point >= 0
+        points.append(point)
+    rows = np.flatnonzero(located)
+    return (
+        np.tile(rows, len(corners)),
+        np.concatenate([point[rows] for point in points]),
+        np.concatenate([weight[rows] for _, _, weight in corners]),
+        located
+    )
+
+def neighbor_entries(kdtree, centroids, neighbors=idw_neighbors, power=idw_power, max_distance=idw_max_distance):
+    """ Inverse distance weights the nearest points of each centroid - at most
+    neighbors points, only those within max_distance when it is given, or every
+    point within max_distance when neighbors is None
+
+    Keyword arguments:
+        kdtree: scipy.spatial.cKDTree -- kdtree of the windgrid points
+        centroids: 2d array -- x and y coordinates of the tract centroids as the columns
+        neighbors: int -- largest number of points weighted, None for every point within max_distance
+        power: float -- power applied to the neighbor distances
+        max_distance: float -- farthest a weighted point may be from the centroid, None for no limit
+
+    Returns:
+        rows, points, weights: 1d arrays -- the centroid, point and weight of each nonzero weight,
+            a centroid with no point in reach has none
+    """
+    from utils import thread_count
+
+    if neighbors is None:
+        if max_distance is None:
+            raise ValueError('idw_max_distance must be set to weight every point within it')
+        found = kdtree.query_ball_point(centroids, r=max_distance, workers=thread_count(), return_sorted=False)
+        lengths = np.array([len(x) for x in found], dtype='int64')
+        rows = np.repeat(np.arange(len(centroids)), lengths)
+        points = np.concatenate([np.asarray(x, dtype='int64') for x in found]) if len(found) else np.empty(0, dtype='int64')
+        distances = np.linalg.norm(kdtree.data[points] - centroids[rows], axis=1)
+    else:
+        k = min(neighbors, kdtree.n)
+        distances, points = kdtree.query(
+            centroids, k=k, workers=thread_count(), distance_upper_bound=np.inf if max_distance is None else max_distance
+        )
+        distances = distances.reshape(len(centroids), k)
+        points = points.reshape(len(centroids), k)
+        # missing neighbors have an infinite distance
+        found = np.isfinite(distances)
+        rows = np.nonzero(found)[0]
+        distances, points = distances[found], points[found]
+
+    # a point on the centroid is weighted like idw_weights, by shifting the centroid's distances
+    exact_hits = np.zeros(len(centroids), dtype=bool)
+    exact_hits[rows[distances == 0]] = True
+    distances = distances + np.where(exact_hits[rows], 0.000000001, 0)
+    weights = 1 / distances ** power
+    weights /= np.bincount(rows, weights=weights, minlength=len(centroids))[rows]
+    return rows, points, weights
+
+def interpolation_weights(xy, centroids, method=interpolation, neighbors=idw_neighbors, power=idw_power, max_distance=idw_max_distance, search=None):
+    """ Builds the sparse matrix that interpolates windgrid point values at tract centroids
+
+    Keyword arguments:
+        xy: 2d array -- x and y coordinates of the windgrid points as the columns
+        centroids: 2d array -- x and y coordinates of the tract centroids as the columns
+        method: str -- 'idw', 'nearest' or 'bilinear', see interpolation in config.py - on a
+            regular lattice 'nearest' and 'bilinear' find the nodes by index arithmetic, centroids
+            off the lattice fall back to the nearest point ('nearest') or inverse distance weighting
+        neighbors: int -- largest number of points weighted, None for every point within max_distance
+        power: float -- power applied to the neighbor distances
+        max_distance: float -- farthest a weighted point may be from the centroid in the units of search, None for no limit
+        search: tuple -- (points, centroids) transformed by search_coordinates to measure the distances
+            in, None measures them in degrees - 'bilinear' still finds its lattice in degrees
+
+    Returns:
+        weights: scipy.sparse.csr_matrix -- (centroids x points) weights, a centroid with no point in reach has an empty row
+    """
+    from scipy.spatial import cKDTree
+    from scipy.sparse import csr_matrix
+
+    if method not in ('idw', 'nearest', 'bilinear'):
+        raise ValueError(f"unknown interpolation '{method}' - use 'idw', 'nearest' or 'bilinear'")
+    xy = np.asarray(xy, dtype=float)
+    centroids = np.asarray(centroids, dtype=float).reshape(-1, 2)
+    points_space, centroids_space = search if search is not None else (xy, centroids)
+    entries = []
+    remaining = np.arange(len(centroids))
+    # the lattice's nearest node in degrees need not be the nearest point in other spaces
+    if method == 'bilinear' or (method == 'nearest' and search is None):
+        lattice = detect_lattice(xy) if len(xy) else None
+        if lattice is not None:
+            rows, points, weights, located = lattice_entries(lattice, centroids, method)
+            entries.append((rows, points, weights))
+            remaining = np.flatnonzero(~located)
+    if len(remaining) and len(xy):
+        rows, points, weights = neighbor_entries(
+            cKDTree(points_space), centroids_space[remaining], neighbors=1 if method == 'nearest' else neighbors,
+            power=power, max_distance=max_distance
+        )
+        entries.append((remaining[rows], points, weights))
+    rows, points, weights = (np.concatenate([x[part] for x in entries]) if entries else np.empty(0) for part in range(3))
+    weights = csr_matrix((weights, (rows.astype('int64'), points.astype('int64'))), shape=(len(centroids), len(xy)))
+    if max_distance is not None and method != 'idw':
+        # lattice nodes are only weighted within max_distance too
+        weights = drop_distant(weights, points_space, centroids_space, max_distance)
+    return weights
+
+def drop_distant(weights, xy, centroids, max_distance):
+    """ Removes the weights of points farther than max_distance from their centroid and renormalizes the rest """
+    from scipy.sparse import csr_matrix
+
+    weights = weights.tocoo()
+    near = np.linalg.norm(xy[weights.col] - centroids[weights.row], axis=1) <= max_distance
+    rows, points, values = weights.row[near], weights.col[near], weights.data[near]
+    totals = np.bincount(rows, weights=values, minlength=weights.shape[0])
+    values = np.divide(values, totals[rows], out=np.zeros_like(values), where=totals[rows] > 0)
+    return csr_matrix((values, (rows, points)), shape=weights.shape)
+
+def tract_weights(xy, tracts, tracts_selection, method=interpolation, neighbors=idw_neighbors, power=idw_power, max_distance=idw_max_distance, distance=idw_distance, crs=idw_crs):
+    """ Builds the interpolation weights at the centroids of the selected tracts, measuring
+    distances as configured - the tract centroids are transformed once and kept in the
+    tract cache, so only the windgrid points are transformed here
+
+    Keyword arguments:
+        xy: 2d array -- longitudes and latitudes of the windgrid points as the columns
+        tracts: TractIndex -- the cached tracts, see tracts.load_tracts
+        tracts_selection: 1d array -- cache positions of the tracts to interpolate at
+        method: str -- 'idw', 'nearest' or 'bilinear', see interpolation in config.py
+        neighbors: int -- largest number of points weighted, None for every point within max_distance
+        power: float -- power applied to the neighbor distances
+        max_distance: float -- farthest a weighted point may be from the centroid in degrees, None for no limit
+        distance: str -- 'degrees', 'sphere' or 'projected', see idw_distance in config.py
+        crs: str -- projected crs of 'projected' distances
+
+    Returns:
+        weights: scipy.sparse.csr_matrix -- (tracts x points) weights, see interpolation_weights
+    """
+    search = None
+    if distance != 'degrees':
+        search = search_coordinates(xy, distance, crs), tracts.search_centroids(distance, crs)[tracts_selection]
+    return interpolation_weights(
+        xy, tracts.centroids[tracts_selection], method=method, neighbors=neighbors, power=power,
+        max_distance=search_distance(max_distance, distance), search=search
+    )
+
+def apply_weights(weights, z):
+    """ Interpolates point values with the weights of interpolation_weights
+
+    Keyword arguments:
+        weights: scipy.sparse.csr_matrix -- (centroids x points) weights
+        z: 1d array -- point values, or a 2d (points x fields) array
+
+    Returns:
+        zis: 1d array -- value at each centroid, NaN where no point was in reach (2d with a column per field if z is 2d)
+    """
+    zis = weights @ np.asarray(z, dtype=float)
+    zis[np.diff(weights.indptr) == 0] = np.nan
+    return zis
\ No newline at end of file
@@ -0,0 +1,146 @@
+import os
+import numpy as np
+from converters import csv_extensions, shapefile_extensions, geotiff_extensions, packed_extensions, load_settings
+from utils import replace_atomically
+
+# coordinate fields of a packed point windgrid, every other field is a wind field
+packed_coordinates = ('x', 'y')
+
+def pack_points(x, y, z, wind_fields, packed_file):
+    """ Writes windgrid points as one .npy file of float64 columns - a single record
+    whose fields are (points,) arrays, so the file is a C-contiguous (fields x points)
+    array with the field names in its header and each column is one contiguous slice
+
+    Keyword arguments:
+        x: 1d array -- point longitudes
+        y: 1d array -- point latitudes
+        z: 1d array -- point windspeeds, or a 2d (points x fields) array
+        wind_fields: list<str> -- the name of each windspeed field
+        packed_file: str -- file location of the .npy file
+    """
+    z = np.asarray(z, dtype=float).reshape(len(x), len(wind_fields))
+    names = list(packed_coordinates) + list(wind_fields)
+    if len(set(names)) != len(names):
+        raise ValueError(f"wind fields can not be named {' or '.join(packed_coordinates)}")
+    points = np.empty(1, dtype=[(name, 'f8', (len(x),)) for name in names])
+    columns = packed_table(points)
+    columns[0], columns[1] = x, y
+    columns[2:] = z.T
+
+    def write(temporary_file):
+        with open(temporary_file, 'wb') as file:
+            np.save(file, points)
+
+    replace_atomically(packed_file, write)
+
+def pack_raster(input_file, packed_file):
+    """ Copies a windgrid raster to an uncompressed tiled GeoTIFF, which GDAL
+    reads a window at a time without decoding
+
+    Keyword arguments:
+        input_file: str -- file location of the windgrid GeoTIFF or ArcGrid
+        packed_file: str -- file location of the GeoTIFF
+    """
+    import rasterio as rio
+    from rasterio.shutil import copy
+
+    def write(temporary_file):
+        with rio.open(input_file) as src:
+            copy(src, temporary_file, driver='GTiff', tiled=True, blockxsize=512, blockysize=512, compress='none', BIGTIFF='IF_SAFER')
+
+    replace_atomically(packed_file, write)
+
+def pack_windgrid(input_file, output_dir, settings=None):
+    """ Converts a windgrid to a binary form that is read without parsing - point
+    windgrids (.csv, excel, Shapefile) become a .npy file of x, y and each wind
+    field as contiguous columns, rasters (GeoTIFF, ArcGrid) an uncompressed tiled GeoTIFF
+
+    Keyword arguments:
+        input_file: str -- file location of the windgrid
+        output_dir: str -- directory to write the packed windgrid to
+        settings: dict -- settings of the run, see converters.load_settings
+
+    Returns:
+        packed_file: str -- file location of the packed windgrid
+    """
+    from readers import read_csv_windgrid, read_shapefile_windgrid, csv_columns, shapefile_columns, is_multi_field, match_fields
+
+    settings = settings or load_settings()
+    name = os.path.basename(os.path.normpath(input_file))
+    stem = '.'.join(name.split('.')[0:-1]) or name
+    os.makedirs(output_dir, exist_ok=True)
+    wind_field = settings['wind_field']
+    if name.endswith(csv_extensions + shapefile_extensions + packed_extensions):
+        columns = csv_columns if name.endswith(csv_extensions) else shapefile_columns if name.endswith(shapefile_extensions) else packed_columns
+        wind_fields = match_fields(columns(input_file), wind_field) if is_multi_field(wind_field) else [wind_field]
+        if name.endswith(csv_extensions):
+            x, y, z = read_csv_windgrid(input_file, settings['latitude_field'], settings['longitude_field'], wind_fields)
+        elif name.endswith(shapefile_extensions):
+            x, y, z = read_shapefile_windgrid(input_file, wind_fields)
+        else:
+            x, y, z = read_packed_windgrid(input_file, wind_fields)
+        packed_file = os.path.join(output_dir, f'{stem}.npy')
+        if os.path.abspath(packed_file) == os.path.abspath(input_file):
+            raise ValueError(f'{input_file} is already packed')
+        pack_points(x, y, z, wind_fields, packed_file)
+    else:
+        # GeoTIFFs keep their name, ArcGrids get the .tif extension
+        packed_file = os.path.join(output_dir, name if name.endswith(geotiff_extensions) else f'{name}.tif')
+        if os.path.abspath(packed_file) == os.path.abspath(input_file):
+            raise ValueError(f'{input_file} is already packed')
+        pack_raster(input_file, packed_file)
+    return packed_file
+
+def packed_columns(input_file):
+    """ Reads the wind field names of a packed point windgrid """
+    names = np.load(input_file, mmap_mode='r').dtype.names
+    return [x for x in names if x not in packed_coordinates]
+
+def packed_table(points):
+    """ Views a packed point windgrid as a (fields x points) array in the order of points.dtype.names
+
+    Keyword arguments:
+        points: numpy array -- the packed windgrid, see pack_points
+
+    Returns:
+        table: 2d array -- a view of the fields
+    """
+    if points.shape != (1,) or any(points.dtype[name].shape == () for name in points.dtype.names):
+        raise ValueError('not a packed windgrid - a single record of float64 columns, see pack_points')
+    return points.view('f8').reshape(len(points.dtype.names), -1)
+
+def read_packed_windgrid(input_file, wind_field):
+    """ Reads a packed point windgrid memory-mapped - the columns are views of the
+    page cache, so workers converting the same windgrid share one copy and only
+    the pages of the fields read are touched
+
+    Keyword arguments:
+        input_file: str -- file location of the .npy windgrid
+        wind_field: str -- the field name of the windspeeds, or a list of field names
+
+    Returns:
+        x, y: 1d arrays -- longitudes and latitudes
+        z: 1d array -- windspeeds, 2d (points x fields) when wind_field is a list
+        points missing any of the values are dropped
+    """
+    points = np.load(input_file, mmap_mode='r')
+    names = list(points.dtype.names)
+    wind_fields = [wind_field] if isinstance(wind_field, str) else list(wind_field)
+    missing = [x for x in wind_fields if x not in names]
+    if missing:
+        raise ValueError(f"{input_file} has no field {', '.join(missing)}")
+    table = packed_table(points)
+    x, y = table[names.index('x')], table[names.index('y')]
+    rows = [names.index(field) for field in wind_fields]
+    if isinstance(wind_field, str):
+        z = table[rows[0]]
+    elif rows == list(range(rows[0], rows[0] + len(rows))):
+        # consecutive fields, like every member of an ensemble, are a (points x fields) view without a copy
+        z = table[rows[0]:rows[0] + len(rows)].T
+    else:
+        z = table[rows].T
+    # pack_windgrid only writes finite values, other .npy files are checked
+    finite = np.isfinite(x) & np.isfinite(y) & np.isfinite(z).reshape(len(x), -1).all(axis=1)
+    if not finite.all():
+        return x[finite], y[finite], z[finite]
+    return x, y, z
\ No newline at end of file
@@ -0,0 +1,99 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from converters import load_settings, windgrid_files, read_csv_file, read_shapefile_file, read_packed_file, csv_file_to_dat, shapefile_file_to_dat, packed_file_to_dat
+from profiling import RunProfile
+from config import pipeline_pending_writes
+
+# how the reader stage reads each point converter's windgrid, rasters are only read through the OS cache
+point_readers = {
+    csv_file_to_dat: read_csv_file,
+    shapefile_file_to_dat: read_shapefile_file,
+    packed_file_to_dat: read_packed_file,
+}
+
+def warm_files(input_file, block_size=1 << 20):
+    """ Reads every file of a windgrid once so the converter reads them from the OS
+    cache instead of the disk or network share
+
+    Keyword arguments:
+        input_file: str -- file location of the windgrid
+        block_size: int -- bytes read at a time
+    """
+    buffer = bytearray(block_size)
+    for file in windgrid_files(input_file) or []:
+        try:
+            with open(file, 'rb', buffering=0) as windgrid:
+                while windgrid.readinto(buffer):
+                    pass
+        except OSError:
+            # the converter reports the missing or unreadable file
+            pass
+
+def read_ahead(conversion, settings=None):
+    """ The reader stage of the pipeline - reads and decodes a windgrid while the
+    one before it is converted
+
+    Keyword arguments:
+        conversion: tuple -- (converter, input_file, output_file) from converters.list_conversions
+        settings: dict -- settings of the run, see converters.load_settings
+
+    Returns:
+        windgrid: tuple -- (points, stage) where points is the windgrid of a point converter (see
+            converters.read_point_windgrid) or None for a raster, whose files are only read through
+            the OS cache, and stage is the timing of that read for the conversion's profile - None
+            for a windgrid that is already up to date
+        entry: dict -- the manifest entry of an incremental run, which hashed the windgrid's
+            contents, see incremental.manifest_entry (None when the run is not incremental)
+    """
+    from incremental import read_manifest, manifest_entry, is_current
+    from tracts import load_tracts
+
+    converter, input_file, output_file = conversion
+    settings = settings or load_settings()
+    entry = None
+    if settings['incremental']:
+        previous = read_manifest(output_file)
+        entry = manifest_entry(conversion, settings, previous, load_tracts())
+        if is_current(output_file, entry, previous):
+            return None, entry
+    reading = RunProfile()
+    if converter in point_readers:
+        with reading.stage('read'):
+            points = point_readers[converter](input_file, settings)
+    else:
+        with reading.stage('prefetch'):
+            warm_files(input_file)
+        points = None
+    return (points, reading.stages[0]), entry
+
+class BackgroundWriter:
+    """ The writer stage of the pipeline - runs the writes it is given one after
+    another on a single thread, so the next windgrid is converted while the last
+    one's DAT files are written. Submitting blocks while max_pending writes are
+    waiting, which caps the memory held by converted windspeeds.
+    """
+    def __init__(self, max_pending=pipeline_pending_writes):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.slots = threading.BoundedSemaphore(max(1, max_pending))
+        # every write submitted, in order
+        self.futures = []
+
+    def submit(self, function, *args):
+        """ Runs function(*args) on the writer thread once the writes before it are done
+
+        Returns:
+            future: concurrent.futures.Future -- holds the error if the write fails
+        """
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(function, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda x: self.slots.release())
+        self.futures.append(future)
+        return future
+
+    def close(self):
+        """ Waits for every write to finish """
+        self.executor.shutdown(wait=True)
\ No newline at end of file
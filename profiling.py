@@ -0,0 +1,144 @@
+import json
+import os
+import sys
+import threading
+from time import perf_counter, process_time
+from datetime import datetime
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # windows
+    resource = None
+
+def peak_rss_mb():
+    """ Peak resident memory of this process so far in MB, None if it can not be read
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on linux, bytes on macos
+        return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memory = psutil.Process().memory_info()
+    return getattr(memory, 'peak_wset', memory.rss) / (1 << 20)
+
+class RunProfile:
+    """ Records the wall time, cpu time and peak memory of each stage of a
+    conversion along with counts such as the input points and tracts selected.
+    Cpu time includes every thread of the process, so it can exceed the wall
+    time when a stage is threaded.
+    """
+    def __init__(self):
+        self.stages = []
+        self.counts = {}
+        self.lock = threading.Lock()
+        # the first error raised in a stage
+        self.error = None
+
+    @contextmanager
+    def stage(self, name):
+        """ Times the code run inside the with block as the named stage
+
+        Keyword arguments:
+            name: str -- name of the stage, eg. 'read' or 'idw'
+        """
+        wall, cpu = perf_counter(), process_time()
+        try:
+            yield
+        except BaseException as e:
+            self.error = self.error or repr(e)
+            raise
+        finally:
+            self.stages.append({
+                'name': name,
+                'wall_seconds': perf_counter() - wall,
+                'cpu_seconds': process_time() - cpu,
+                'peak_rss_mb': peak_rss_mb()
+            })
+
+    def add_stage(self, stage):
+        """ Records a stage timed by another profile, eg. the read of a windgrid the pipeline read ahead """
+        self.stages.append(stage)
+
+    def count(self, name, value):
+        """ Records a count of the run, eg. count('input_points', len(z)) """
+        self.counts[name] = int(value)
+
+    def add(self, name, value):
+        """ Adds to a count of the run from any thread, eg. add('pixels_read', image.size) """
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + int(value)
+
+    def to_dict(self):
+        return {'stages': self.stages, 'counts': self.counts}
+
+def profile_files(output_file):
+    """ Names the profile files written next to a DAT file
+
+    Keyword arguments:
+        output_file: str -- file location and name of output DAT file
+
+    Returns:
+        json_file, cprofile_file: str -- locations of the stage summary and the cProfile dump
+    """
+    stem = output_file[:-len('.dat')] if output_file.endswith('.dat') else output_file
+    return f'{stem}.profile.json', f'{stem}.prof'
+
+@contextmanager
+def run_profile(input_file, output_file, settings, defer=None):
+    """ Profiles the conversion run inside the with block - when settings['profile']
+    is set the stages and counts are written as JSON next to the DAT file, and when
+    settings['cprofile'] is set a cProfile dump is written there as well (open it
+    with pstats or snakeviz). The summary is written even if the conversion fails.
+
+    Keyword arguments:
+        input_file: str -- file location of the windgrid
+        output_file: str -- file location and name of output DAT file
+        settings: dict -- settings of the run, see converters.load_settings
+        defer: function -- defers the writes of the conversion like converters.csv_file_to_dat, the summary
+            is then deferred after them so it includes their stages (None writes it when the block exits)
+
+    Returns:
+        profile: RunProfile -- to record the stages and counts of the conversion
+    """
+    profile = RunProfile()
+    json_file, cprofile_file = profile_files(output_file)
+    profiler = None
+    if settings.get('cprofile'):
+        import cProfile
+        profiler = cProfile.Profile()
+    started = datetime.now()
+
+    def write_summary():
+        with open(json_file, 'w') as file:
+            json.dump({
+                'input_file': input_file,
+                'output_file': output_file,
+                'started': started.isoformat(timespec='seconds'),
+                'pid': os.getpid(),
+                'error': profile.error,
+                **profile.to_dict()
+            }, file, indent=2)
+
+    try:
+        with profile.stage('total'):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield profile
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+    finally:
+        if profiler is not None:
+            profiler.dump_stats(cprofile_file)
+        if settings.get('profile'):
+            # a failed conversion defers no writes, so its summary is written now
+            if defer is None or profile.error is not None:
+                write_summary()
+            else:
+                defer(write_summary)
\ No newline at end of file
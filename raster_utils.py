@@ -0,0 +1,511 @@
+import rasterio as rio
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import shapely
+from rasterio.features import rasterize
+from rasterio.mask import mask
+from rasterio.windows import Window
+from utils import write_dat_files, timed_write, mph_to_mps, thread_count
+from tracts import bounds_overlap
+from profiling import RunProfile
+from config import dat_header, raster_method, raster_block_pixels, tract_selection
+
+# raster methods that sample the raster at the tract centroids instead of averaging over the tract polygons
+sample_methods = ('nearest', 'bilinear')
+
+def raster_bands(input_file, bands):
+    """ Lists the bands of a raster to convert
+
+    Keyword arguments:
+        input_file: str -- file location of the windgrid raster
+        bands: -- a list of band numbers, 'all' for every band or None for the first band only
+
+    Returns:
+        bands: list<int> -- band numbers, None to convert the first band to a single DAT file
+    """
+    if bands is None:
+        return None
+    if bands == 'all' or bands == ['all']:
+        with rio.open(input_file) as src:
+            return list(src.indexes)
+    return [int(x) for x in bands]
+
+def block_windows(src, block_pixels=raster_block_pixels):
+    """ Splits a raster into windows aligned to its internal blocks, merging
+    neighboring blocks until a window holds about block_pixels pixels so small
+    tiles and single row strips are not read one at a time
+
+    Keyword arguments:
+        src: rasterio.DatasetReader -- open windgrid raster
+        block_pixels: int -- target number of pixels per window
+
+    Returns:
+        windows: generator<rasterio.windows.Window> -- windows covering the raster
+    """
+    block_height, block_width = src.block_shapes[0]
+    width = min(src.width, block_width * max(1, int(np.sqrt(block_pixels)) // block_width))
+    height = min(src.height, block_height * max(1, block_pixels // (width * block_height)))
+    for row in range(0, src.height, height):
+        for col in range(0, src.width, width):
+            yield Window(col, row, min(width, src.width - col), min(height, src.height - row))
+
+def map_dataset_threads(src, function, items, workers=None):
+    """ Splits items into one group per thread and calls function(dataset, group)
+    for each group in a thread pool - every thread reads through its own handle
+    of the raster since a dataset handle cannot be shared between threads
+
+    Keyword arguments:
+        src: rasterio.DatasetReader -- open windgrid raster
+        function: function -- called with a dataset and a list of items
+        items: list -- windows or tracts to split between the threads
+        workers: int -- number of threads (None uses the threads of this process, see utils.thread_count, 1 runs on src directly)
+
+    Returns:
+        results: list -- the result of each group
+    """
+    workers = min(thread_count(workers), len(items))
+    if workers <= 1:
+        return [function(src, items)]
+    # interleave the items so a swath in one corner of the raster is still shared by every thread
+    groups = [items[start::workers] for start in range(workers)]
+    def run(group):
+        with rio.open(src.name) as dataset:
+            return function(dataset, group)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run, groups))
+
+def footprint_touches(geometry, footprint, footprint_window, transform):
+    """ Tests whether a geometry intersects any nonzero pixel of a footprint,
+    looking only at the pixels under the geometry's bounding box
+
+    Keyword arguments:
+        geometry: shapely.geometry -- geometry to test
+        footprint: 2d array -- True where the raster has wind
+        footprint_window: rasterio.windows.Window -- window of the footprint in the raster
+        transform: affine.Affine -- transform of the raster, pixel corners are
+            computed from it so they do not depend on the window
+
+    Returns:
+        touches: bool -- True if the geometry intersects a nonzero pixel
+    """
+    minx, miny, maxx, maxy = geometry.bounds
+    # all four corners, the bounding box of a rotated or sheared raster is not aligned to its pixels
+    cols, rows = ~transform * (np.array([minx, maxx, maxx, minx]), np.array([maxy, maxy, miny, miny]))
+    rows -= footprint_window.row_off
+    cols -= footprint_window.col_off
+    # pad by a pixel so pixels touching the bounding box edge are included
+    row_start = max(int(np.floor(rows.min())) - 1, 0)
+    row_stop = min(int(np.ceil(rows.max())) + 1, footprint.shape[0])
+    col_start = max(int(np.floor(cols.min())) - 1, 0)
+    col_stop = min(int(np.ceil(cols.max())) + 1, footprint.shape[1])
+    if row_start >= row_stop or col_start >= col_stop:
+        return False
+    pixel_rows, pixel_cols = np.nonzero(footprint[row_start:row_stop, col_start:col_stop])
+    if pixel_rows.size == 0:
+        return False
+    pixel_rows += row_start + int(footprint_window.row_off)
+    pixel_cols += col_start + int(footprint_window.col_off)
+    if transform.is_rectilinear:
+        x0, y0 = transform * (pixel_cols, pixel_rows)
+        x1, y1 = transform * (pixel_cols + 1, pixel_rows + 1)
+        pixels = shapely.box(np.minimum(x0, x1), np.minimum(y0, y1), np.maximum(x0, x1), np.maximum(y0, y1))
+    else:
+        # the pixels of a rotated or sheared raster are parallelograms
+        xs, ys = transform * (
+            np.stack([pixel_cols, pixel_cols + 1, pixel_cols + 1, pixel_cols]),
+            np.stack([pixel_rows, pixel_rows, pixel_rows + 1, pixel_rows + 1])
+        )
+        pixels = shapely.polygons(np.stack([xs.T, ys.T], axis=-1))
+    shapely.prepare(geometry)
+    return bool(shapely.intersects(geometry, pixels).any())
+
+def read_window(dataset, indexes, window, profile=None):
+    """ Reads bands of a raster window, adding the pixels read to the profile's pixels_read count """
+    image = dataset.read(indexes, window=window)
+    if profile is not None:
+        profile.add('pixels_read', image.size)
+    return image
+
+def read_nonzero(dataset, window, bands=None, profile=None):
+    """ Reads which pixels of a window are nonzero in the first band, or in any of the given bands """
+    if bands is None:
+        return read_window(dataset, 1, window, profile) > 0
+    return (read_window(dataset, bands, window, profile) > 0).any(axis=0)
+
+def select_tracts(src, tracts, bands=None, profile=None):
+    """ Selects the tracts that intersect the nonzero pixels of a raster without
+    polygonizing them, one block window at a time - tracts containing a nonzero
+    pixel center are found with one rasterize call per window and only the
+    remaining candidates are tested pixel by pixel
+
+    Keyword arguments:
+        src: rasterio.DatasetReader -- open windgrid raster
+        tracts: TractIndex -- tracts to select from, see tracts.load_tracts
+        bands: list<int> -- bands a pixel may be nonzero in, None for the first band
+        profile: RunProfile -- counts the pixels read, None counts nothing
+
+    Returns:
+        indices: 1d array -- sorted tract positions in the cache
+    """
+    candidates = tracts.overlapping(src.bounds)
+    geometries = tracts.geometries(candidates)
+    geometry_bounds = shapely.bounds(geometries)
+
+    def select_in_windows(dataset, windows):
+        selected = np.zeros(len(candidates), dtype=bool)
+        for window in windows:
+            nonZeroMask = read_nonzero(dataset, window, bands, profile)
+            nonZeroRows = np.flatnonzero(nonZeroMask.any(axis=1))
+            nonZeroCols = np.flatnonzero(nonZeroMask.any(axis=0))
+            if nonZeroRows.size == 0:
+                continue
+
+            # crop the window to the extent of its nonzero pixels
+            footprint = nonZeroMask[nonZeroRows[0]:nonZeroRows[-1] + 1, nonZeroCols[0]:nonZeroCols[-1] + 1]
+            footprint_window = Window(
+                window.col_off + nonZeroCols[0], window.row_off + nonZeroRows[0],
+                footprint.shape[1], footprint.shape[0]
+            )
+            transform = dataset.window_transform(footprint_window)
+            # pad the bounds by a pixel so tracts only touching the outer pixels are not lost to rounding
+            minx, miny, maxx, maxy = window_bounds(footprint_window, dataset.transform)
+            padding = max(abs(dataset.transform.a) + abs(dataset.transform.b), abs(dataset.transform.d) + abs(dataset.transform.e))
+            padded_bounds = (minx - padding, miny - padding, maxx + padding, maxy + padding)
+            in_window = np.flatnonzero(~selected & bounds_overlap(geometry_bounds, padded_bounds))
+            if in_window.size == 0:
+                continue
+
+            # tracts containing a nonzero pixel center
+            labels = rasterize(
+                ((geometries[index], label + 1) for label, index in enumerate(in_window)),
+                out_shape=footprint.shape,
+                transform=transform,
+                fill=0,
+                all_touched=False,
+                dtype='int32'
+            )
+            selected[in_window[np.unique(labels[footprint & (labels > 0)]) - 1]] = True
+
+            # tracts that only cross or touch nonzero pixels
+            for index in in_window[~selected[in_window]]:
+                selected[index] = footprint_touches(geometries[index], footprint, footprint_window, dataset.transform)
+
+        return selected
+
+    selected = np.logical_or.reduce(map_dataset_threads(src, select_in_windows, list(block_windows(src))))
+    return candidates[selected]
+
+def select_tracts_at_centroids(src, tracts, bands=None, profile=None):
+    """ Selects the tracts whose centroid falls on a nonzero pixel of a raster,
+    like the centroid selection of the Hazus syTract table - no polygon is decoded
+
+    Keyword arguments:
+        src: rasterio.DatasetReader -- open windgrid raster
+        tracts: TractIndex -- tracts to select from, see tracts.load_tracts
+        bands: list<int> -- bands a pixel may be nonzero in, None for the first band
+        profile: RunProfile -- counts the pixels read, None counts nothing
+
+    Returns:
+        indices: 1d array -- sorted tract positions in the cache
+    """
+    candidates = tracts.overlapping(src.bounds)
+    # pixel of each centroid, those off the raster are dropped
+    cols, rows = ~src.transform * tuple(np.asarray(tracts.centroids[candidates]).T)
+    cols, rows = np.floor(cols).astype('int64'), np.floor(rows).astype('int64')
+    on_raster = (cols >= 0) & (cols < src.width) & (rows >= 0) & (rows < src.height)
+    candidates, cols, rows = candidates[on_raster], cols[on_raster], rows[on_raster]
+
+    def select_in_windows(dataset, windows):
+        selected = np.zeros(len(candidates), dtype=bool)
+        for window in windows:
+            row_off, col_off = int(window.row_off), int(window.col_off)
+            in_window = np.flatnonzero(
+                (cols >= col_off) & (cols < col_off + window.width) & (rows >= row_off) & (rows < row_off + window.height)
+            )
+            if in_window.size == 0:
+                continue
+            nonZeroMask = read_nonzero(dataset, window, bands, profile)
+            selected[in_window] = nonZeroMask[rows[in_window] - row_off, cols[in_window] - col_off]
+        return selected
+
+    selected = np.logical_or.reduce(map_dataset_threads(src, select_in_windows, list(block_windows(src))))
+    return candidates[selected]
+
+def mask_means(src, geometries, bands=None, profile=None):
+    """ Calculates the mean raster value of each tract by masking and cropping the raster once per tract
+
+    Keyword arguments:
+        src: rasterio.DatasetReader -- open windgrid raster
+        geometries: 1d array -- tract polygons to calculate the means of
+        bands: list<int> -- bands to average, None for the first band
+        profile: RunProfile -- counts the pixels read, None counts nothing
+
+    Returns:
+        means: 1d array -- mean raster value of each tract, 2d (tracts x bands) when bands are given
+    """
+    indexes = [1] if bands is None else bands
+    def mask_tracts(dataset, indices):
+        means = []
+        for index in indices:
+            try:
+                rasterMask, rasterMaskTransform = mask(dataset=dataset, shapes=[geometries[index]], all_touched=False, crop=True, nodata=0, indexes=indexes)
+                if profile is not None:
+                    profile.add('pixels_read', rasterMask.size)
+                means.append(np.mean(rasterMask, axis=(1, 2)))
+            except ValueError:
+                # the tract only touches the edge of the raster
+                means.append(np.zeros(len(indexes)))
+        return indices, means
+
+    means = np.zeros((len(geometries), len(indexes)))
+    for indices, group_means in map_dataset_threads(src, mask_tracts, list(range(len(geometries)))):
+        if indices:
+            means[indices] = group_means
+    return means[:, 0] if bands is None else means
+
+def window_bounds(window, transform):
+    """ Bounds of a raster window under any affine transform - rasterio.windows.bounds
+    only transforms two corners, which misses part of the window of a rotated raster
+    """
+    col_min, row_min = window.col_off, window.row_off
+    col_max, row_max = col_min + window.width, row_min + window.height
+    xs, ys = transform * (np.array([col_min, col_max, col_max, col_min]), np.array([row_min, row_min, row_max, row_max]))
+    return xs.min(), ys.min(), xs.max(), ys.max()
+
+def window_pixels(src, geometries):
+    """ Counts the pixels of the window rasterio's mask crops each tract to, see rasterio.features.geometry_window
+
+    Keyword arguments:
+        src: rasterio.DatasetReader -- open windgrid raster
+        geometries: 1d array -- tract polygons
+
+    Returns:
+        pixels: 1d array -- pixels of each tract's bounding window on the raster, 0 off the raster
+    """
+    if not src.transform.is_rectilinear:
+        from rasterio.features import geometry_window
+        from rasterio.errors import WindowError
+
+        pixels = np.zeros(len(geometries), dtype='int64')
+        for index, geometry in enumerate(geometries):
+            try:
+                window = geometry_window(src, [geometry])
+            except WindowError:
+                continue
+            pixels[index] = int(window.width) * int(window.height)
+        return pixels
+    # a rectilinear transform maps the corners of a tract's bounds to the corners of its pixel bounds
+    minx, miny, maxx, maxy = shapely.bounds(geometries).reshape(-1, 4).T
+    cols, rows = ~src.transform * (np.stack([minx, maxx, maxx, minx]), np.stack([maxy, maxy, miny, miny]))
+    col_start, col_stop = np.floor(cols.min(axis=0)), np.ceil(cols.max(axis=0))
+    row_start, row_stop = np.floor(rows.min(axis=0)), np.ceil(rows.max(axis=0))
+    width = np.clip(col_stop, 0, src.width) - np.clip(col_start, 0, src.width)
+    height = np.clip(row_stop, 0, src.height) - np.clip(row_start, 0, src.height)
+    return (np.maximum(width, 0) * np.maximum(height, 0)).astype('int64')
+
+def zonal_means(src, geometries, bands=None, inside=False, profile=None):
+    """ Calculates the mean raster value of each tract one block window at a time -
+    burns the tracts overlapping the window into a label array aligned to the
+    source grid and adds the pixels of each label to running sums with np.bincount.
+    The sums are divided by the pixels of each tract's bounding window, which counts
+    the pixels outside the tract as 0 like mask_means, or with inside set by the
+    valid pixels inside the tract only
+
+    Keyword arguments:
+        src: rasterio.DatasetReader -- open windgrid raster
+        geometries: 1d array -- tract polygons to calculate the means of
+        bands: list<int> -- bands to average, None for the first band
+        inside: bool -- average only the valid pixels inside each tract
+        profile: RunProfile -- counts the pixels read, None counts nothing
+
+    Returns:
+        means: 1d array -- mean raster value of each tract (0 where a tract covers no valid pixels),
+            2d (tracts x bands) when bands are given
+    """
+    geometry_bounds = shapely.bounds(geometries).reshape(-1, 4)
+    indexes = [1] if bands is None else bands
+
+    def sum_in_windows(dataset, windows):
+        sums = np.zeros((len(indexes), len(geometries)))
+        counts = np.zeros((len(indexes), len(geometries)))
+        for window in windows:
+            in_window = np.flatnonzero(bounds_overlap(geometry_bounds, window_bounds(window, dataset.transform)))
+            if in_window.size == 0:
+                continue
+            # label 0 is the background, the nth tract in the window is burned as n + 1
+            labels = rasterize(
+                ((geometries[index], label + 1) for label, index in enumerate(in_window)),
+                out_shape=(int(window.height), int(window.width)),
+                transform=dataset.window_transform(window),
+                fill=0,
+                all_touched=False,
+                dtype='int32'
+            )
+            # the tract labels are shared by every band, only the sums are per band
+            inside = labels > 0
+            for band, image in enumerate(read_window(dataset, indexes, window, profile)):
+                valid = inside & np.isfinite(image)
+                if dataset.nodata is not None:
+                    valid &= image != dataset.nodata
+                tract_indices = in_window[labels[valid] - 1]
+                sums[band] += np.bincount(tract_indices, weights=image[valid], minlength=len(geometries))
+                counts[band] += np.bincount(tract_indices, minlength=len(geometries))
+        return sums, counts
+
+    results = map_dataset_threads(src, sum_in_windows, list(block_windows(src)))
+    sums = np.sum([x[0] for x in results], axis=0)
+    if inside:
+        counts = np.sum([x[1] for x in results], axis=0)
+    else:
+        counts = np.broadcast_to(window_pixels(src, geometries), sums.shape)
+    means = np.zeros((len(indexes), len(geometries)))
+    np.divide(sums, counts, out=means, where=counts > 0)
+    return means[0] if bands is None else means.T
+
+def sample_at_points(src, xy, method='bilinear', bands=None, profile=None):
+    """ Samples a raster at points, reading only the block windows that hold a point -
+    the pixels around every point in a window are gathered with one array lookup.
+    Nodata and non-finite pixels are left out of the interpolation like they are left
+    out of the zonal means, points off the raster take the value at the nearest edge
+
+    Keyword arguments:
+        src: rasterio.DatasetReader -- open windgrid raster
+        xy: 2d array -- x and y coordinates of the points as the columns
+        method: str -- 'nearest' for the value of the pixel under each point, 'bilinear'
+            to interpolate between the four nearest pixel centers
+        bands: list<int> -- bands to sample, None for the first band
+        profile: RunProfile -- counts the pixels read, None counts nothing
+
+    Returns:
+        values: 1d array -- raster value at each point (0 where no valid pixel is near),
+            2d (points x bands) when bands are given
+    """
+    if method not in sample_methods:
+        raise ValueError(f"unknown sample method '{method}' - use 'nearest' or 'bilinear'")
+    indexes = [1] if bands is None else bands
+    xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+    cols, rows = ~src.transform * (xy[:, 0], xy[:, 1])
+    if method == 'nearest':
+        # the pixel containing the point, a single corner with all of the weight
+        rows = np.clip(np.floor(rows), 0, src.height - 1)
+        cols = np.clip(np.floor(cols), 0, src.width - 1)
+        corners = [(0, 0)]
+    else:
+        # position relative to the pixel centers, between the first and last centers
+        rows = np.clip(rows - 0.5, 0, src.height - 1)
+        cols = np.clip(cols - 0.5, 0, src.width - 1)
+        corners = [(0, 0), (0, 1), (1, 0), (1, 1)]
+    row0, col0 = rows.astype('int64'), cols.astype('int64')
+    row_fraction, col_fraction = rows - row0, cols - col0
+
+    def sample_in_windows(dataset, windows):
+        sums = np.zeros((len(indexes), len(xy)))
+        weights = np.zeros((len(indexes), len(xy)))
+        for window in windows:
+            row_off, col_off = int(window.row_off), int(window.col_off)
+            in_window = np.flatnonzero(
+                (col0 >= col_off) & (col0 < col_off + window.width) & (row0 >= row_off) & (row0 < row_off + window.height)
+            )
+            if in_window.size == 0:
+                continue
+            # one more row and column so the far corners of the last pixels are read with the window
+            height = min(int(window.height) + 1, dataset.height - row_off)
+            width = min(int(window.width) + 1, dataset.width - col_off)
+            image = read_window(dataset, indexes, Window(col_off, row_off, width, height), profile)
+            for row_step, col_step in corners:
+                corner_rows = np.minimum(row0[in_window] + row_step, dataset.height - 1) - row_off
+                corner_cols = np.minimum(col0[in_window] + col_step, dataset.width - 1) - col_off
+                weight = (row_fraction[in_window] if row_step else 1 - row_fraction[in_window]) \
+                    * (col_fraction[in_window] if col_step else 1 - col_fraction[in_window])
+                values = image[:, corner_rows, corner_cols]
+                valid = np.isfinite(values)
+                if dataset.nodata is not None:
+                    valid &= values != dataset.nodata
+                sums[:, in_window] += np.where(valid, values, 0) * weight
+                weights[:, in_window] += valid * weight
+        return sums, weights
+
+    results = map_dataset_threads(src, sample_in_windows, list(block_windows(src)))
+    sums = np.sum([x[0] for x in results], axis=0)
+    weights = np.sum([x[1] for x in results], axis=0)
+    values = np.zeros((len(indexes), len(xy)))
+    np.divide(sums, weights, out=values, where=weights > 0)
+    return values[0] if bands is None else values.T
+
+def calculate_windspeeds_at_tracts(src, geometries, method=raster_method, bands=None, profile=None):
+    """ Calculates the mean windspeed of each tract covered by a windgrid raster
+
+    Keyword arguments:
+        src: rasterio.DatasetReader -- open windgrid raster
+        geometries: 1d array -- tract polygons to calculate the windspeeds of
+        method: str -- 'zonal', 'zonal_inside', 'mask', 'nearest' or 'bilinear', see raster_method in config.py
+        bands: list<int> -- bands to average, None for the first band
+        profile: RunProfile -- counts the pixels read, None counts nothing
+
+    Returns:
+        windspeeds: 1d array -- mean windspeed of each tract in m/s, 2d (tracts x bands) when bands are given
+    """
+    if method in sample_methods:
+        means = sample_at_points(src, shapely.get_coordinates(shapely.centroid(geometries)), method=method, bands=bands, profile=profile)
+    elif method in ('zonal', 'zonal_inside'):
+        means = zonal_means(src, geometries, bands=bands, inside=method == 'zonal_inside', profile=profile)
+    elif method == 'mask':
+        means = mask_means(src, geometries, bands=bands, profile=profile)
+    else:
+        raise ValueError(f"unknown raster method '{method}' - use 'zonal', 'zonal_inside', 'mask', 'nearest' or 'bilinear'")
+    return mph_to_mps(means)
+
+def raster_to_dat(input_file, tracts, output_file, dat_header=dat_header, method=raster_method, bands=None, selection=tract_selection, profile=None, writer=write_dat_files, defer=None):
+    """ Creates a Hazus DAT file containing the mean windspeed in m/s of every tract covered by a windgrid raster -
+    with bands given, the tracts are selected and burned once and a DAT file is written per band
+
+    Keyword arguments:
+        input_file: str -- file location of the windgrid raster
+        tracts: TractIndex -- tracts to select from, see tracts.load_tracts
+        output_file: str -- file location and name of output DAT file, or a list with one per band
+        dat_header: list<str> -- a list of strings to be used as the header of the DAT file
+        method: str -- 'zonal', 'zonal_inside', 'mask', 'nearest' or 'bilinear', see raster_method in config.py
+        bands: list<int> -- bands to convert, None for the first band
+        selection: str -- 'polygon' or 'centroid', see tract_selection in config.py
+        profile: RunProfile -- records the stages and counts of the run, see profiling.run_profile
+        writer: function -- writes the DAT files, called like write_dat_files
+        defer: function -- defer(function, *args) runs the write later, None writes before returning
+
+    Returns:
+        tracts_selection: 1d array -- cache positions of the tracts written
+        windspeeds: 1d array -- windspeeds in m/s of the tracts written, 2d (tracts x bands) when bands
+            are given with NaN where a tract has no wind in that band
+    """
+    profile = profile or RunProfile()
+    # every read of the raster adds the pixels it read
+    profile.count('pixels_read', 0)
+    with rio.open(input_file) as src:
+        with profile.stage('tract_selection'):
+            if selection == 'polygon':
+                tractsSelection = select_tracts(src, tracts, bands=bands, profile=profile)
+            elif selection == 'centroid':
+                tractsSelection = select_tracts_at_centroids(src, tracts, bands=bands, profile=profile)
+            else:
+                raise ValueError(f"unknown tract selection '{selection}' - use 'polygon' or 'centroid'")
+        profile.count('tracts_selected', len(tractsSelection))
+        if method in sample_methods:
+            # sampled at the cached centroids, no polygon is decoded
+            with profile.stage(method):
+                windspeeds = mph_to_mps(sample_at_points(src, tracts.centroids[tractsSelection], method=method, bands=bands, profile=profile))
+        else:
+            with profile.stage('load_polygons'):
+                geometries = tracts.geometries(tractsSelection)
+            with profile.stage(method):
+                windspeeds = calculate_windspeeds_at_tracts(src, geometries, method=method, bands=bands, profile=profile)
+    # only tracts with wind are written
+    has_wind = windspeeds > 0
+    if bands is not None:
+        windspeeds = np.where(has_wind, windspeeds, np.nan)
+        has_wind = has_wind.any(axis=1)
+    tractsSelection = tractsSelection[has_wind]
+    windspeeds = windspeeds[has_wind]
+    centroids = tracts.centroids[tractsSelection]
+    output_files = [output_file] if isinstance(output_file, str) else output_file
+    timed_write(profile, defer, writer, output_files, tracts.geoid[tractsSelection], centroids[:, 0], centroids[:, 1], windspeeds, dat_header)
+    profile.count('tracts_written', len(tractsSelection))
+    return tractsSelection, windspeeds
\ No newline at end of file
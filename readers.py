@@ -0,0 +1,134 @@
+import numpy as np
+from fnmatch import fnmatchcase
+from config import latitude_field, longitude_field, wind_field
+
+excel_extensions = ('.xls', '.xlsx', '.xlsm', '.xlsb', '.odf', '.ods', '.odt')
+
+def is_multi_field(wind_field):
+    """ Tests whether a wind_field setting names many fields - a list or a glob pattern like 'member_*' """
+    return not isinstance(wind_field, str) or any(x in wind_field for x in '*?[')
+
+def match_fields(columns, wind_field):
+    """ Finds the wind fields of a windgrid
+
+    Keyword arguments:
+        columns: list<str> -- column names of the windgrid
+        wind_field: str -- a column name or glob pattern, or a list of them
+
+    Returns:
+        fields: list<str> -- matching column names, in the order of wind_field and then of the columns
+    """
+    patterns = [wind_field] if isinstance(wind_field, str) else list(wind_field)
+    fields = []
+    for pattern in patterns:
+        matches = [x for x in columns if fnmatchcase(x, pattern)] if is_multi_field(pattern) else [pattern]
+        if not matches:
+            raise ValueError(f"no fields match '{pattern}'")
+        fields += [x for x in matches if x not in fields]
+    return fields
+
+def csv_columns(input_file):
+    """ Reads the column names of a windgrid .csv or excel file """
+    import pandas as pd
+
+    if input_file.endswith(excel_extensions):
+        return list(pd.read_excel(input_file, nrows=0).columns)
+    return list(pd.read_csv(input_file, nrows=0).columns)
+
+def shapefile_columns(input_file):
+    """ Reads the field names of a windgrid Shapefile """
+    import geopandas as gpd
+
+    return [x for x in gpd.read_file(input_file, rows=0).columns if x != 'geometry']
+
+def read_csv_windgrid(input_file, latitude_field=latitude_field, longitude_field=longitude_field, wind_field=wind_field, chunk_size=1000000):
+    """ Reads the coordinates and windspeeds of a windgrid .csv or excel file as
+    float arrays, keeping only those columns in memory - a .csv is read in
+    chunks with pyarrow when it is installed and with the pandas C parser otherwise
+
+    Keyword arguments:
+        input_file: str -- file location of the windgrid
+        latitude_field: str -- the column name for the latitude coordinates (use WGS84)
+        longitude_field: str -- the column name for the longitude coordinates (use WGS84)
+        wind_field: str -- the column name of the windspeeds, or a list of column names
+        chunk_size: int -- number of rows parsed at a time
+
+    Returns:
+        x, y: 1d arrays -- longitudes and latitudes
+        z: 1d array -- windspeeds, 2d (points x fields) when wind_field is a list
+        rows missing any of the values are dropped
+    """
+    import pandas as pd
+
+    wind_fields = [wind_field] if isinstance(wind_field, str) else list(wind_field)
+    fields = [longitude_field, latitude_field] + wind_fields
+    if input_file.endswith(excel_extensions):
+        df = pd.read_excel(input_file, usecols=fields)
+        chunks = [df[fields].to_numpy(dtype=float)]
+    else:
+        try:
+            chunks = read_csv_chunks_pyarrow(input_file, fields, chunk_size)
+        except ImportError:
+            chunks = [
+                df[fields].to_numpy(dtype=float)
+                for df in pd.read_csv(input_file, usecols=fields, dtype=float, chunksize=chunk_size, float_precision='round_trip')
+            ]
+    columns = np.concatenate(chunks) if chunks else np.empty((0, len(fields)))
+    columns = columns[np.isfinite(columns).all(axis=1)]
+    return columns[:, 0], columns[:, 1], columns[:, 2] if isinstance(wind_field, str) else columns[:, 2:]
+
+def read_csv_chunks_pyarrow(input_file, fields, chunk_size):
+    """ Streams the given columns of a .csv with pyarrow
+
+    Keyword arguments:
+        input_file: str -- file location of the .csv
+        fields: list<str> -- column names to read
+        chunk_size: int -- approximate number of rows parsed at a time
+
+    Returns:
+        chunks: list<2d array> -- (rows x fields) float arrays
+    """
+    import pyarrow as pa
+    from pyarrow import csv
+
+    # about 64 bytes a row, so a block holds roughly chunk_size rows
+    reader = csv.open_csv(
+        input_file,
+        read_options=csv.ReadOptions(block_size=max(chunk_size * 64, 1 << 20)),
+        convert_options=csv.ConvertOptions(
+            include_columns=fields,
+            column_types={field: pa.float64() for field in fields}
+        )
+    )
+    chunks = []
+    for batch in reader:
+        chunks.append(np.column_stack([
+            batch.column(field).to_numpy(zero_copy_only=False) for field in fields
+        ]))
+    return chunks
+
+def read_shapefile_windgrid(input_file, wind_field=wind_field):
+    """ Reads the coordinates and windspeeds of a windgrid point or polygon Shapefile
+    as float arrays, using the centroid of any geometry that is not a point
+
+    Keyword arguments:
+        input_file: str -- file location of the windgrid
+        wind_field: str -- the field name of the windspeeds, or a list of field names
+
+    Returns:
+        x, y: 1d arrays -- longitudes and latitudes
+        z: 1d array -- windspeeds, 2d (points x fields) when wind_field is a list
+        features missing any of the values are dropped
+    """
+    import geopandas as gpd
+    import shapely
+
+    wind_fields = [wind_field] if isinstance(wind_field, str) else list(wind_field)
+    gdf = gpd.read_file(input_file, columns=wind_fields)
+    geometries = np.asarray(gdf.geometry.values)
+    # missing and empty geometries have no coordinates
+    has_geometry = ~(shapely.is_missing(geometries) | shapely.is_empty(geometries))
+    xy = shapely.get_coordinates(shapely.centroid(geometries[has_geometry]))
+    columns = np.column_stack([xy, gdf[wind_fields].to_numpy(dtype=float)[has_geometry]])
+    columns = columns[np.isfinite(columns).all(axis=1)]
+    return columns[:, 0], columns[:, 1], columns[:, 2] if isinstance(wind_field, str) else columns[:, 2:]
@@ -5,6 +5,7 @@ import os
 import geopandas as gpd
 from shutil import rmtree
 from config import input_dir, output_dir
+from tracts import build_tract_cache
 
 def download_and_return_content(url, destination):
     print('downloading...')
@@ -35,6 +36,7 @@ def setup_db():
     tracts = tracts.to_crs('epsg:4326')
     os.mkdir('db/tracts')
     tracts.to_file('db/tracts/tracts.shp', driver="ESRI Shapefile")
+    build_tract_cache(tracts)
     rmtree(destination)
 
 def setup_directories():
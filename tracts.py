@@ -0,0 +1,226 @@
+import os
+import hashlib
+import numpy as np
+import shapely
+from functools import lru_cache
+
+tracts_file = 'db/tracts/tracts.shp'
+tracts_cache_dir = 'db/tracts/cache'
+tracts_cache_files = ('geoid', 'centroids', 'bounds', 'wkb', 'wkb_offsets')
+
+def build_tract_cache(tracts, cache_dir=tracts_cache_dir):
+    """ Writes the precomputed tract arrays used by the converters - GEOIDs,
+    centroids, bounding boxes and the polygons as one contiguous WKB buffer
+
+    Keyword arguments:
+        tracts: geopandas.GeoDataFrame -- tracts in epsg:4326 with a GEOID field
+        cache_dir: str -- directory to write the .npy files to
+    """
+    from utils import replace_atomically
+
+    print('caching tracts...')
+    os.makedirs(cache_dir, exist_ok=True)
+    # version.txt is written last, so load_tracts rebuilds a cache whose build was interrupted
+    version_file = os.path.join(cache_dir, 'version.txt')
+    if os.path.isfile(version_file):
+        os.remove(version_file)
+    # centroids transformed for the old tracts, see TractIndex.search_centroids
+    for name in os.listdir(cache_dir):
+        if name.startswith('centroids_'):
+            os.remove(os.path.join(cache_dir, name))
+    geometries = np.asarray(tracts.geometry.values, dtype=object)
+    centroids = shapely.centroid(geometries)
+    wkbs = shapely.to_wkb(geometries)
+    wkb_offsets = np.zeros(len(wkbs) + 1, dtype='int64')
+    np.cumsum([len(x) for x in wkbs], out=wkb_offsets[1:])
+    save_array(os.path.join(cache_dir, 'geoid.npy'), np.asarray(tracts['GEOID'], dtype=str))
+    save_array(os.path.join(cache_dir, 'centroids.npy'), shapely.get_coordinates(centroids))
+    save_array(os.path.join(cache_dir, 'bounds.npy'), shapely.bounds(geometries))
+    save_array(os.path.join(cache_dir, 'wkb.npy'), np.frombuffer(b''.join(wkbs), dtype='uint8'))
+    save_array(os.path.join(cache_dir, 'wkb_offsets.npy'), wkb_offsets)
+    version = hash_tract_cache(cache_dir)
+
+    def write(temporary_file):
+        with open(temporary_file, 'w') as file:
+            file.write(version)
+
+    replace_atomically(version_file, write)
+
+def save_array(array_file, values):
+    """ Saves an array to a .npy file of the tract cache through utils.replace_atomically """
+    from utils import replace_atomically
+
+    def write(temporary_file):
+        with open(temporary_file, 'wb') as file:
+            np.save(file, values)
+
+    replace_atomically(array_file, write)
+
+def hash_tract_cache(cache_dir=tracts_cache_dir):
+    """ Hashes the contents of the tract cache files
+
+    Keyword arguments:
+        cache_dir: str -- directory of the tract cache
+
+    Returns:
+        version: str -- sha256 hex digest, changes whenever the tracts change
+    """
+    digest = hashlib.sha256()
+    for name in tracts_cache_files:
+        with open(os.path.join(cache_dir, f'{name}.npy'), 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def bounds_overlap(bounds_array, bounds):
+    """ Tests which bounding boxes overlap a bounding box, touching edges included
+
+    Keyword arguments:
+        bounds_array: 2d array -- (minx, miny, maxx, maxy) rows to test
+        bounds: tuple -- (minx, miny, maxx, maxy) to test against
+
+    Returns:
+        overlaps: 1d array -- True where a row overlaps bounds
+    """
+    minx, miny, maxx, maxy = bounds
+    return (
+        (bounds_array[:, 0] <= maxx) & (bounds_array[:, 2] >= minx) &
+        (bounds_array[:, 1] <= maxy) & (bounds_array[:, 3] >= miny)
+    )
+
+class TractIndex:
+    """ Read-only view of the tract cache - the arrays are memory-mapped and the
+    polygons are only decoded for the tracts that ask for them
+    """
+    def __init__(self, cache_dir=tracts_cache_dir):
+        def load(name):
+            return np.load(os.path.join(cache_dir, f'{name}.npy'), mmap_mode='r')
+        self.geoid = load('geoid')
+        self.centroids = load('centroids')
+        self.bounds = load('bounds')
+        self._wkb = load('wkb')
+        self._wkb_offsets = load('wkb_offsets')
+        self.cache_dir = cache_dir
+        self._version = None
+        self._search_centroids = {}
+
+    def __len__(self):
+        return len(self.geoid)
+
+    @property
+    def version(self):
+        """ Identifies the tract data, see build_tract_cache """
+        if self._version is None:
+            with open(os.path.join(self.cache_dir, 'version.txt')) as file:
+                self._version = file.read().strip()
+        return self._version
+
+    def search_centroids(self, distance, crs):
+        """ The centroids in the coordinates interpolation measures distances in, see
+        interpolation.search_coordinates - transformed on first use and kept next to
+        the other cache files, so later runs only load them
+
+        Keyword arguments:
+            distance: str -- 'sphere' or 'projected', see idw_distance in config.py
+            crs: str -- projected crs of 'projected' distances
+
+        Returns:
+            centroids: 2d array -- transformed centroids, in the order of the cache
+        """
+        from interpolation import search_coordinates
+
+        key = distance if distance != 'projected' else f'{distance}_{hashlib.sha256(crs.encode()).hexdigest()[:16]}'
+        if key not in self._search_centroids:
+            centroids_file = os.path.join(self.cache_dir, f'centroids_{key}.npy')
+            if os.path.isfile(centroids_file):
+                centroids = np.load(centroids_file, mmap_mode='r')
+            else:
+                centroids = search_coordinates(self.centroids, distance, crs)
+                try:
+                    save_array(centroids_file, centroids)
+                except OSError:
+                    # a read-only tract cache transforms the centroids once per process instead
+                    pass
+            self._search_centroids[key] = centroids
+        return self._search_centroids[key]
+
+    def geometries(self, indices):
+        """ Decodes the polygons of the given tracts
+
+        Keyword arguments:
+            indices: 1d array -- tract positions in the cache
+
+        Returns:
+            geometries: 1d array -- shapely polygons
+        """
+        starts = self._wkb_offsets[indices]
+        ends = self._wkb_offsets[np.asarray(indices) + 1]
+        wkbs = [self._wkb[start:end].tobytes() for start, end in zip(starts, ends)]
+        return shapely.from_wkb(np.asarray(wkbs, dtype=object))
+
+    def overlapping(self, bounds):
+        """ Selects the tracts whose bounding box overlaps a bounding box
+
+        Keyword arguments:
+            bounds: tuple -- (minx, miny, maxx, maxy) to select tracts with
+
+        Returns:
+            indices: 1d array -- sorted tract positions in the cache
+        """
+        return np.flatnonzero(bounds_overlap(self.bounds, bounds))
+
+    def intersecting(self, geometry, convex=False):
+        """ Selects the tracts whose polygon intersects a geometry, testing the
+        polygons only for the tracts whose bounding box overlaps the geometry's
+
+        Keyword arguments:
+            geometry: shapely.geometry -- geometry to select tracts with
+            convex: bool -- True if the geometry is convex (like a convex hull), so tracts
+                whose bounding box corners are all inside it are selected without decoding their polygons
+
+        Returns:
+            indices: 1d array -- sorted tract positions in the cache
+        """
+        candidates = self.overlapping(geometry.bounds)
+        shapely.prepare(geometry)
+        selected = np.zeros(len(candidates), dtype=bool)
+        if convex:
+            minx, miny, maxx, maxy = self.bounds[candidates].T
+            selected = (
+                shapely.contains_xy(geometry, minx, miny) & shapely.contains_xy(geometry, minx, maxy) &
+                shapely.contains_xy(geometry, maxx, miny) & shapely.contains_xy(geometry, maxx, maxy)
+            )
+        undecided = np.flatnonzero(~selected)
+        selected[undecided] = shapely.intersects(geometry, self.geometries(candidates[undecided]))
+        return candidates[selected]
+
+    def centroids_intersecting(self, geometry):
+        """ Selects the tracts whose centroid is inside or on the boundary of a geometry,
+        like the centroid selection of the Hazus syTract table - no polygon is decoded
+
+        Keyword arguments:
+            geometry: shapely.geometry -- geometry to select tracts with
+
+        Returns:
+            indices: 1d array -- sorted tract positions in the cache
+        """
+        candidates = self.overlapping(geometry.bounds)
+        shapely.prepare(geometry)
+        x, y = self.centroids[candidates].T
+        return candidates[shapely.intersects_xy(geometry, x, y)]
+
+@lru_cache(maxsize=None)
+def load_tracts(cache_dir=tracts_cache_dir):
+    """ Loads the tract cache once per process, building it from the tracts
+    shapefile if setup.py predates the cache or its build did not finish
+
+    Keyword arguments:
+        cache_dir: str -- directory of the tract cache
+
+    Returns:
+        tracts: TractIndex -- the cached tracts
+    """
+    if not os.path.isfile(os.path.join(cache_dir, 'version.txt')):
+        import geopandas as gpd
+        build_tract_cache(gpd.read_file(tracts_file), cache_dir)
+    return TractIndex(cache_dir)
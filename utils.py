@@ -1,11 +1,49 @@
-from scipy.spatial import cKDTree
-import geopandas as gpd
-import pandas as pd
 import os
+import io
+import json
 import numpy as np
-from config import wind_field, output_dir, dat_header
+import shapely
+import threading
+from functools import lru_cache
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from tracts import load_tracts
+from profiling import RunProfile
+from interpolation import tract_weights, apply_weights, search_coordinates
+from config import wind_field, dat_header, idw_neighbors, idw_power, idw_max_distance, interpolation, idw_distance, idw_crs, idw_weight_cache, tile_workers, tile_min_locations, tract_selection, dat_compression, dat_sidecar
 
-def idw(kdtree, z, xi, yi):
+# fixed-width layout of the Hazus DAT file, ux and w (m/s) both hold the windspeed
+dat_columns = '      ident        elon      nlat         ux          vy        w (m/s)'
+dat_row_format = '%s    %.4f   %.4f      %.5f     00.00000    %.5f\n'
+# extension added to a DAT file for each compression and sidecar format
+compression_extensions = {'gzip': '.gz', 'zstd': '.zst'}
+sidecar_extensions = {'parquet': '.parquet', 'npz': '.npz'}
+
+# threads one process uses for tiles, raster windows and kdtree queries - batch workers
+# lower it with set_process_threads so they do not oversubscribe the cpus between them
+process_threads = tile_workers
+
+def set_process_threads(threads):
+    """ Sets the threads each windgrid of this process is converted with
+
+    Keyword arguments:
+        threads: int -- number of threads (None uses every cpu)
+    """
+    global process_threads
+    process_threads = threads
+
+def thread_count(workers=None):
+    """ Resolves a number of threads - workers if given, else the threads of this process
+
+    Keyword arguments:
+        workers: int -- number of threads asked for, None for the threads of this process
+
+    Returns:
+        workers: int -- number of threads to use
+    """
+    return workers or process_threads or os.cpu_count()
+
+def idw(kdtree, z, xi, yi, neighbors=idw_neighbors, power=idw_power):
     """ Inverse Distance Weighting - interpolates an unknown value at a 
     specified point by weighting the values of it's nearest neighbors
 
@@ -14,23 +52,163 @@ def idw(kdtree, z, xi, yi):
         z: 1d array -- point values at each location
         xi: float -- x-axis point location of unknown value
         yi: float -- y-axis point location of unknown value
+        neighbors: int -- number of nearest neighbors to weight
+        power: float -- power applied to the neighbor distances
 
     Returns:
         zi: float -- interpolated value at xi, yi
 
     """
-    neighbors = 12
-    power = 2
-    distances, indicies = kdtree.query([xi, yi], k=neighbors)
-    z_n = z[indicies]
-    if 0 not in distances:
-        weights = power / distances
-    else:
-        distances += 0.000000001
-        weights = power / distances
-    weights /= weights.sum(axis=0)
-    zi = np.dot(weights.T, z_n)
-    return zi
+    return idw_batch(kdtree, z, [xi], [yi], neighbors=neighbors, power=power)[0]
+
+def idw_batch(kdtree, z, xis, yis, neighbors=idw_neighbors, power=idw_power, workers=None):
+    """ Inverse Distance Weighting for many points at once - queries the nearest
+    neighbors of every point in a single kdtree call and weights them as one
+    (points x neighbors) array
+
+    Keyword arguments:
+        kdtree: scipy.spatial.ckdtree -- kdtree made from a 2d array of x and y coordinates as the columns 
+        z: 1d array -- point values at each location, or a 2d (points x fields) array to interpolate every field with the same neighbors
+        xis: 1d array -- x-axis point locations of unknown values
+        yis: 1d array -- y-axis point locations of unknown values
+        neighbors: int -- number of nearest neighbors to weight
+        power: float -- power applied to the neighbor distances
+        workers: int -- threads used by the kdtree query (None uses the threads of this process, see thread_count)
+
+    Returns:
+        zis: 1d array -- interpolated values at xis, yis (2d with a column per field if z is 2d)
+
+    """
+    z = np.asarray(z, dtype=float)
+    xy = np.column_stack([np.asarray(xis, dtype=float), np.asarray(yis, dtype=float)])
+    if len(xy) == 0:
+        return np.empty((0,) + z.shape[1:])
+    k = min(neighbors, kdtree.n)
+    distances, indicies = kdtree.query(xy, k=k, workers=thread_count(workers))
+    # a single neighbor query returns 1d arrays
+    distances = distances.reshape(len(xy), k)
+    indicies = indicies.reshape(len(xy), k)
+    return idw_from_neighbors(distances, indicies, z, power=power)
+
+def idw_from_neighbors(distances, indicies, z, power=idw_power):
+    """ Weights the values of already queried nearest neighbors
+
+    Keyword arguments:
+        distances: 2d array -- (points x neighbors) sorted neighbor distances
+        indicies: 2d array -- (points x neighbors) neighbor positions in z
+        z: 1d array -- point values at each location, or a 2d (points x fields) array
+        power: float -- power applied to the neighbor distances
+
+    Returns:
+        zis: 1d array -- interpolated value of each point (2d with a column per field if z is 2d)
+    """
+    weights = idw_weights(distances, power=power)
+    zis = np.einsum('ij,ij...->i...', weights, z[indicies])
+    return zis
+
+def idw_weights(distances, power=idw_power):
+    """ Normalized inverse distance weights of already queried nearest neighbors
+
+    Keyword arguments:
+        distances: 2d array -- (points x neighbors) sorted neighbor distances
+        power: float -- power applied to the neighbor distances
+
+    Returns:
+        weights: 2d array -- (points x neighbors) weights, each row sums to 1
+    """
+    # distances are sorted, so an exact hit is always in the first column
+    exact_hits = distances[:, 0] == 0
+    distances[exact_hits] += 0.000000001
+    weights = 1 / distances ** power
+    weights /= weights.sum(axis=1, keepdims=True)
+    return weights
+
+def idw_tiled(xy, z, xis, yis, neighbors=idw_neighbors, power=idw_power, workers=None):
+    """ Inverse Distance Weighting split into spatial tiles that are interpolated
+    in a thread pool - each tile builds a kdtree of only the points around it and
+    falls back to a kdtree of all points for the few locations whose neighbors
+    may lie outside the tile, so the result matches idw_batch
+
+    Keyword arguments:
+        xy: 2d array -- x and y coordinates of the points as the columns
+        z: 1d array -- point values at each location, or a 2d (points x fields) array
+        xis: 1d array -- x-axis point locations of unknown values
+        yis: 1d array -- y-axis point locations of unknown values
+        neighbors: int -- number of nearest neighbors to weight
+        power: float -- power applied to the neighbor distances
+        workers: int -- number of threads (None uses every cpu)
+
+    Returns:
+        zis: 1d array -- interpolated values at xis, yis, in their original order (2d with a column per field if z is 2d)
+
+    """
+    # scipy is only imported by the windgrids that need interpolating
+    from scipy.spatial import cKDTree
+
+    xy = np.asarray(xy, dtype=float)
+    z = np.asarray(z, dtype=float)
+    xis = np.asarray(xis, dtype=float)
+    yis = np.asarray(yis, dtype=float)
+    workers = thread_count(workers)
+    if workers == 1 or len(xis) < tile_min_locations:
+        return idw_batch(cKDTree(xy), z, xis, yis, neighbors=neighbors, power=power, workers=workers)
+
+    # assign each location to a tile of an n x n grid over the locations
+    tiles_per_side = int(np.ceil(np.sqrt(workers * 4)))
+    tile_x = tile_index(xis, tiles_per_side)
+    tile_y = tile_index(yis, tiles_per_side)
+    order = np.argsort(tile_y * tiles_per_side + tile_x, kind='stable')
+    counts = np.bincount(tile_y * tiles_per_side + tile_x, minlength=tiles_per_side ** 2)
+    tiles = [x for x in np.split(order, np.cumsum(counts)[:-1]) if len(x) > 0]
+
+    all_points_kdtree = []
+    all_points_lock = threading.Lock()
+    def all_points():
+        with all_points_lock:
+            if not all_points_kdtree:
+                all_points_kdtree.append(cKDTree(xy))
+        return all_points_kdtree[0]
+
+    def interpolate_tile(tile):
+        x, y = xis[tile], yis[tile]
+        # points within a margin of half the tile size around the tile
+        margin = max(x.max() - x.min(), y.max() - y.min()) / 2
+        minx, miny, maxx, maxy = x.min() - margin, y.min() - margin, x.max() + margin, y.max() + margin
+        inside = (xy[:, 0] >= minx) & (xy[:, 0] <= maxx) & (xy[:, 1] >= miny) & (xy[:, 1] <= maxy)
+        if inside.sum() < neighbors:
+            return idw_batch(all_points(), z, x, y, neighbors=neighbors, power=power, workers=1)
+        distances, indicies = cKDTree(xy[inside]).query(np.column_stack([x, y]), k=neighbors, workers=1)
+        distances = distances.reshape(len(x), neighbors)
+        indicies = indicies.reshape(len(x), neighbors)
+        # the neighbors are exact when the circle reaching the farthest one stays inside the margin
+        edge = np.min([x - minx, maxx - x, y - miny, maxy - y], axis=0)
+        outside = distances[:, -1] > edge
+        zis = idw_from_neighbors(distances, indicies, z[inside], power=power)
+        if outside.any():
+            zis[outside] = idw_batch(all_points(), z, x[outside], y[outside], neighbors=neighbors, power=power, workers=1)
+        return zis
+
+    zis = np.empty((len(xis),) + z.shape[1:])
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for tile, tile_zis in zip(tiles, executor.map(interpolate_tile, tiles)):
+            zis[tile] = tile_zis
+    return zis
+
+def tile_index(values, tiles_per_side):
+    """ Assigns values to equal width bins between their minimum and maximum
+
+    Keyword arguments:
+        values: 1d array -- coordinates to bin
+        tiles_per_side: int -- number of bins
+
+    Returns:
+        bins: 1d array -- bin of each value, from 0 to tiles_per_side - 1
+    """
+    span = values.max() - values.min()
+    if span == 0:
+        return np.zeros(len(values), dtype='int64')
+    bins = ((values - values.min()) / span * tiles_per_side).astype('int64')
+    return np.minimum(bins, tiles_per_side - 1)
 
 def mph_to_mps(mph):
     if type(mph) == str:
@@ -38,75 +216,500 @@ def mph_to_mps(mph):
     conversion_const = 0.44704
     return mph * conversion_const
 
-def calculate_windspeeds_at_centroids(windspeeds_gdf, tracts):
-    # format data for kdtree and idw
-    xy = np.asarray([[x.x, x.y] for x in windspeeds_gdf.geometry])
-    z = np.asarray([x for x in windspeeds_gdf[wind_field]])
-    xis = np.asarray([x.centroid.x for x in tracts.geometry])
-    yis = np.asarray([x.centroid.y for x in tracts.geometry])
-    
-    # build kdtree
-    kdtree = cKDTree(xy)
-    zis = []
-    for xi, yi in zip(xis, yis):
-        # interpolate windspeed
-        zi = idw(kdtree, z, xi, yi)
-        zis.append(zi)
-    zis = np.asarray(zis)
+def calculate_windspeeds_at_centroids(xy, z, centroids, neighbors=idw_neighbors, power=idw_power):
+    """ Interpolates the windspeed at tract centroids from windgrid points
+
+    Keyword arguments:
+        xy: 2d array -- x and y coordinates of the windgrid points as the columns
+        z: 1d array -- windspeeds of the points in mph, or a 2d (points x fields) array
+        centroids: 2d array -- x and y coordinates of the tract centroids as the columns
+        neighbors: int -- number of nearest neighbors to weight
+        power: float -- power applied to the neighbor distances
+
+    Returns:
+        zis: 1d array -- windspeed at each centroid in m/s (2d with a column per field if z is 2d)
+    """
+    # interpolate windspeeds
+    zis = idw_tiled(xy, z, centroids[:, 0], centroids[:, 1], neighbors=neighbors, power=power)
     # convert to meters/second
     zis = mph_to_mps(zis)
     return zis
 
-def generate_dat_df(windspeeds_array, tracts):
-    df = pd.DataFrame()
-    for index, tract in enumerate(list(tracts.geometry)):
-        df = df.append({
-            'ident': f"{tracts.loc[index]['GEOID']}    ",
-            'elon': f"{'{0:.4f}'.format(float(tract.centroid.x))}   ",
-            'nlat': f"{'{0:.4f}'.format(float(tract.centroid.y))}      ",
-            'ux': f"{'{0:.5f}'.format(windspeeds_array[index])}     ",
-            'vy': f"0{'{0:.5f}'.format(0)}    ",
-            'w (m/s)': f"{'{0:.5f}'.format(windspeeds_array[index])}",
-        }, ignore_index=True)
-
-    df = df.reindex(columns=['ident', 'elon', 'nlat', 'ux', 'vy', 'w (m/s)'])
-    return df
-
-def write_dat_file(output_file, dat_df, dat_header):
-        if not output_file.endswith('.dat'):
-            output_file = f'{output_file}.dat'
-        with open(output_file, "w") as export:
-            # adds columns to the DAT file header
-            dat_header.append('')
-            dat_header.append(
-                '      ident        elon      nlat         ux          vy        w (m/s)')
-
-            # writes header to DAT file
-            for row in dat_header:
-                export.write(row + '\n')
+def convex_hull(xy):
+    """ Computes the convex hull of a set of points with qhull
+
+    Keyword arguments:
+        xy: 2d array -- x and y coordinates of the points as the columns
+
+    Returns:
+        hull: shapely.geometry -- the hull polygon, or a line or point when the points are collinear
+    """
+    from scipy.spatial import ConvexHull, QhullError
+
+    try:
+        return shapely.Polygon(xy[ConvexHull(xy).vertices])
+    except (QhullError, ValueError):
+        # fewer than 3 points or all on one line
+        return shapely.convex_hull(shapely.multipoints(xy))
+
+def select_tracts_in_hull(tracts, xy, selection=tract_selection):
+    """ Selects the tracts covered by the convex hull of windgrid points
+
+    Keyword arguments:
+        tracts: TractIndex -- tracts to select from, see tracts.load_tracts
+        xy: 2d array -- x and y coordinates of the windgrid points as the columns
+        selection: str -- 'polygon' for tracts whose polygon intersects the hull,
+            'centroid' for tracts whose centroid is inside it (see tract_selection in config.py)
+
+    Returns:
+        indices: 1d array -- sorted tract positions in the cache
+    """
+    if selection == 'polygon':
+        return tracts.intersecting(convex_hull(xy), convex=True)
+    elif selection == 'centroid':
+        return tracts.centroids_intersecting(convex_hull(xy))
+    raise ValueError(f"unknown tract selection '{selection}' - use 'polygon' or 'centroid'")
+
+@lru_cache(maxsize=32)
+def format_dat_header(dat_header):
+    """ Formats the header rows and column names of a Hazus DAT file
+
+    Keyword arguments:
+        dat_header: tuple<str> -- the header rows
+
+    Returns:
+        header: str -- the header rows, a blank row and the column names, each ending in a newline
+    """
+    return ''.join(row + '\n' for row in [*dat_header, '', dat_columns])
+
+def format_dat_rows(ident, elon, nlat, windspeeds):
+    """ Formats the body rows of a Hazus DAT file in one pass
+
+    Keyword arguments:
+        ident: 1d array -- tract GEOIDs
+        elon: 1d array -- tract centroid longitudes
+        nlat: 1d array -- tract centroid latitudes
+        windspeeds: 1d array -- tract windspeeds in m/s
+
+    Returns:
+        rows: str -- the fixed-width rows, each ending in a newline
+    """
+    ident = np.asarray(ident).astype(str).tolist()
+    elon = np.asarray(elon, dtype=float).tolist()
+    nlat = np.asarray(nlat, dtype=float).tolist()
+    windspeeds = np.asarray(windspeeds, dtype=float).tolist()
+    values = tuple(value for row in zip(ident, elon, nlat, windspeeds, windspeeds) for value in row)
+    return (dat_row_format * len(ident)) % values
+
+def dat_file(output_file):
+    """ Adds the .dat extension write_dat_file gives an output file name """
+    return output_file if output_file.endswith('.dat') else f'{output_file}.dat'
+
+def replace_atomically(path, write):
+    """ Writes files under temporary names next to them and renames them into place
+    once all are written, so a partial file is never seen - the temporary names hold
+    the process id, so concurrent runs writing the same file never share one
+
+    Keyword arguments:
+        path: str -- file location to write, or a list of them written together
+        write: function -- write(*temporary_files) writes each file to its temporary name,
+            writers that add an extension (np.save, np.savez) should be given an open file
+    """
+    paths = [path] if isinstance(path, str) else list(path)
+    temporary_files = [f'{x}.{os.getpid()}.tmp' for x in paths]
+    try:
+        write(*temporary_files)
+        for temporary_file, x in zip(temporary_files, paths):
+            os.replace(temporary_file, x)
+    except BaseException:
+        for temporary_file in temporary_files:
+            try:
+                os.remove(temporary_file)
+            except FileNotFoundError:
+                pass
+        raise
+
+def open_compressed(file, mode, compression):
+    """ Opens a gzip or zstd compressed file - zstd is read and written with pyarrow
+
+    Keyword arguments:
+        file: str -- file location
+        mode: str -- 'rb' to read bytes, 'w' to write text
+        compression: str -- 'gzip' or 'zstd'
+
+    Returns:
+        file: file object
+    """
+    if compression == 'gzip':
+        import gzip
+
+        return gzip.open(file, 'wt' if mode == 'w' else mode, compresslevel=6)
+    elif compression == 'zstd':
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError('zstd compressed DAT files need pyarrow - pip install pyarrow')
+        if mode == 'w':
+            return io.TextIOWrapper(pa.CompressedOutputStream(file, 'zstd'))
+        return pa.CompressedInputStream(file, 'zstd')
+    raise ValueError(f"unknown DAT compression '{compression}' - use 'gzip' or 'zstd'")
+
+def write_dat_file(output_file, ident, elon, nlat, windspeeds, dat_header, chunk_size=100000, compression=dat_compression, sidecar=dat_sidecar):
+    """ Writes a Hazus DAT file, formatting and writing the rows in buffered chunks -
+    each chunk is formatted once and also written to the compressed copy, if any
+
+    Keyword arguments:
+        output_file: str -- file location and name of output DAT file
+        ident: 1d array -- tract GEOIDs
+        elon: 1d array -- tract centroid longitudes
+        nlat: 1d array -- tract centroid latitudes
+        windspeeds: 1d array -- tract windspeeds in m/s
+        dat_header: list<str> -- a list of strings to be used as the header of the DAT file
+        chunk_size: int -- number of rows formatted per write
+        compression: str -- also write <output_file>.gz ('gzip') or .zst ('zstd'), None for only the DAT file
+        sidecar: str -- also write the columns to <output_file>.parquet ('parquet') or .npz ('npz'), see write_dat_sidecar
+    """
+    output_file = dat_file(output_file)
+    ident = np.asarray(ident)
+    elon = np.asarray(elon)
+    nlat = np.asarray(nlat)
+    windspeeds = np.asarray(windspeeds)
+    if compression is not None and compression not in compression_extensions:
+        raise ValueError(f"unknown DAT compression '{compression}' - use 'gzip' or 'zstd'")
+    if sidecar is not None and sidecar not in sidecar_extensions:
+        raise ValueError(f"unknown DAT sidecar '{sidecar}' - use 'parquet' or 'npz'")
+    outputs = [output_file]
+    if compression is not None:
+        outputs.append(output_file + compression_extensions[compression])
+    if sidecar is not None:
+        outputs.append(output_file + sidecar_extensions[sidecar])
+
+    def write(*temporary_files):
+        with ExitStack() as stack:
+            exports = [stack.enter_context(open(temporary_files[0], "w", buffering=1024 * 1024))]
+            if compression is not None:
+                exports.append(stack.enter_context(open_compressed(temporary_files[1], 'w', compression)))
+            # writes header and columns to DAT file
+            header = format_dat_header(tuple(dat_header))
+            for export in exports:
+                export.write(header)
 
             # writes data to DAT file
-            for row in range(len(dat_df[dat_df.columns[0]])):
-                writeRow = ''
-                for item in dat_df.iloc[row]:
-                    writeRow = writeRow + item
-                export.write(writeRow + '\n')
+            for start in range(0, len(ident), chunk_size):
+                end = start + chunk_size
+                rows = format_dat_rows(ident[start:end], elon[start:end], nlat[start:end], windspeeds[start:end])
+                for export in exports:
+                    export.write(rows)
+        if sidecar is not None:
+            write_dat_sidecar(temporary_files[-1], ident, elon, nlat, windspeeds, dat_header, sidecar)
+
+    replace_atomically(outputs, write)
+
+def write_dat_sidecar(sidecar_file, ident, elon, nlat, windspeeds, dat_header, sidecar='parquet'):
+    """ Writes the columns of a DAT file in a columnar binary form that is read
+    without parsing text - the GEOIDs as strings, the rest as float64
+
+    Keyword arguments:
+        sidecar_file: str -- file location of the sidecar
+        ident: 1d array -- tract GEOIDs
+        elon: 1d array -- tract centroid longitudes
+        nlat: 1d array -- tract centroid latitudes
+        windspeeds: 1d array -- tract windspeeds in m/s
+        dat_header: list<str> -- the header rows of the DAT file, kept with the columns
+        sidecar: str -- 'parquet' (needs pyarrow) or 'npz'
+    """
+    ident = np.asarray(ident).astype(str)
+    columns = {
+        'ident': ident,
+        'elon': np.asarray(elon, dtype=float),
+        'nlat': np.asarray(nlat, dtype=float),
+        'windspeed': np.asarray(windspeeds, dtype=float)
+    }
+    if sidecar == 'parquet':
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('parquet DAT sidecars need pyarrow - pip install pyarrow')
+        table = pa.table(columns).replace_schema_metadata({'dat_header': json.dumps(list(dat_header))})
+        pq.write_table(table, sidecar_file)
+    elif sidecar == 'npz':
+        # np.savez adds .npz to a name without it, so the file object keeps the name given
+        with open(sidecar_file, 'wb') as file:
+            np.savez(file, dat_header=np.asarray(list(dat_header), dtype=str), **columns)
+    else:
+        raise ValueError(f"unknown DAT sidecar '{sidecar}' - use 'parquet' or 'npz'")
+
+def read_dat_file(input_file):
+    """ Reads a Hazus DAT file back into arrays - the rows are split on whitespace
+    and converted column by column, so write_dat_file(output_file, *read_dat_file(input_file))
+    writes the same file. Compressed copies (.gz, .zst) and sidecars (.parquet, .npz)
+    are read by their extension.
+
+    Keyword arguments:
+        input_file: str -- file location of the DAT file
+
+    Returns:
+        ident: 1d array -- tract GEOIDs as strings
+        elon: 1d array -- tract centroid longitudes
+        nlat: 1d array -- tract centroid latitudes
+        windspeeds: 1d array -- tract windspeeds in m/s (the w column)
+        dat_header: list<str> -- the header rows
+    """
+    if input_file.endswith(sidecar_extensions['parquet']):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(input_file)
+        dat_header = json.loads((table.schema.metadata or {}).get(b'dat_header', b'[]'))
+        return (
+            np.asarray(table['ident'].to_numpy(zero_copy_only=False), dtype=str), table['elon'].to_numpy(),
+            table['nlat'].to_numpy(), table['windspeed'].to_numpy(), dat_header
+        )
+    if input_file.endswith(sidecar_extensions['npz']):
+        with np.load(input_file) as sidecar:
+            return sidecar['ident'], sidecar['elon'], sidecar['nlat'], sidecar['windspeed'], sidecar['dat_header'].tolist()
+
+    compression = next((x for x, extension in compression_extensions.items() if input_file.endswith(extension)), None)
+    with (open(input_file, 'rb') if compression is None else open_compressed(input_file, 'rb', compression)) as file:
+        text = file.read()
+    columns = dat_columns.encode()
+    position = text.find(columns)
+    if position < 0:
+        raise ValueError(f'{input_file} has no DAT column names')
+    header_rows = text[:position].decode().splitlines()
+    # the header is followed by a blank row before the column names
+    if header_rows and header_rows[-1] == '':
+        header_rows = header_rows[:-1]
+    return (*parse_dat_rows(text[position + len(columns):]), header_rows)
+
+def parse_dat_rows(body, chunk_size=100000):
+    """ Parses the body rows of a DAT file vectorized - the token boundaries are
+    found with one scan of the bytes and every number is built from its digits,
+    so no Python string is made per value
+
+    Keyword arguments:
+        body: bytes -- the rows of a DAT file after the column names
+        chunk_size: int -- number of rows whose numbers are built at a time
 
-def geodataframe_to_dat(gdf, output_file):
+    Returns:
+        ident: 1d array -- tract GEOIDs as strings
+        elon: 1d array -- tract centroid longitudes
+        nlat: 1d array -- tract centroid latitudes
+        windspeeds: 1d array -- tract windspeeds in m/s (the w column)
+    """
+    chars = np.frombuffer(body, dtype=np.uint8)
+    # spaces, tabs and line breaks all separate values
+    separator = np.concatenate(([True], chars <= 32, [True]))
+    boundaries = np.flatnonzero(separator[1:] != separator[:-1])
+    starts, ends = boundaries[0::2], boundaries[1::2]
+    if len(starts) % 6:
+        raise ValueError('DAT rows must have 6 columns')
+    starts, ends = starts.reshape(-1, 6), ends.reshape(-1, 6)
+
+    lengths = ends[:, 0] - starts[:, 0]
+    if len(lengths) and (lengths == lengths[0]).all():
+        # GEOIDs of one width are copied out as a (rows x width) byte array
+        ident = chars[starts[:, :1] + np.arange(lengths[0])].view(f'S{lengths[0]}').ravel().astype(str)
+    else:
+        ident = np.array([body[start:end].decode() for start, end in zip(starts[:, 0], ends[:, 0])])
+    elon, nlat, windspeeds = (
+        np.concatenate([np.empty(0)] + [
+            parse_decimals(chars, starts[start:start + chunk_size, column], ends[start:start + chunk_size, column])
+            for start in range(0, len(starts), chunk_size)
+        ])
+        for column in (1, 2, 5)
+    )
+    return ident, elon, nlat, windspeeds
+
+def parse_decimals(chars, starts, ends):
+    """ Converts decimal numbers with the same number of decimals, like the %.4f
+    columns of a DAT file, to floats from their bytes - the numbers are right
+    aligned into a (numbers x width) byte array, so the digits are weighted by a
+    single product with the powers of ten and divided by a power of ten, which
+    rounds exactly like float(). Other numbers are left to float().
+
+    Keyword arguments:
+        chars: 1d array -- uint8 bytes holding the numbers
+        starts: 1d array -- position of the first byte of each number
+        ends: 1d array -- position after the last byte of each number
+
+    Returns:
+        values: 1d array -- the numbers as float64
+    """
+    if len(starts) == 0:
+        return np.empty(0)
+    width = int((ends - starts).max())
+    positions = ends[:, None] - width + np.arange(width)
+    # the columns left of a shorter number are read as leading zeros
+    values = np.where(positions >= starts[:, None], chars[np.maximum(positions, 0)], np.uint8(48))
+    digit = values - np.uint8(48) < 10
+    point = values == 46
+    minus = (values == 45) & (positions == starts[:, None])
+    # the decimal point must be in the same column of every number
+    point_column = np.flatnonzero(point[0])
+    if (
+        len(point_column) != 1 or not point[:, point_column[0]].all() or
+        not (digit | point | minus).all() or width > 16
+    ):
+        return np.array([bytes(chars[start:end]) for start, end in zip(starts, ends)]).astype(float)
+    decimals = width - 1 - point_column[0]
+    # the power of ten of each digit column, 0 for the decimal point column
+    powers = 10.0 ** (np.cumsum(~point[0][::-1])[::-1] - 1)
+    powers[point_column[0]] = 0
+    mantissas = np.where(digit, values - np.uint8(48), np.uint8(0)).astype(float) @ powers
+    return np.where(minus.any(axis=1), -mantissas, mantissas) / 10.0 ** decimals
+
+def timed_write(profile, defer, writer, *args):
+    """ Runs writer(*args) as the write stage of a profile - the stage is timed when
+    the write runs, which a deferred write does after the conversion returns
+
+    Keyword arguments:
+        profile: RunProfile -- records the write stage, see profiling.run_profile
+        defer: function -- defer(function, *args) runs the write later, None writes now
+        writer: function -- writes the DAT files, called like write_dat_files
+    """
+    def write():
+        with profile.stage('write'):
+            writer(*args)
+
+    if defer is None:
+        write()
+    else:
+        defer(write)
+
+def write_dat_files(output_files, ident, elon, nlat, windspeeds, dat_header, compression=dat_compression, sidecar=dat_sidecar):
+    """ Writes a Hazus DAT file for each column of windspeeds - a tract is left out
+    of the files where its windspeed is NaN
+
+    Keyword arguments:
+        output_files: list<str> -- file location and name of each output DAT file
+        ident: 1d array -- tract GEOIDs
+        elon: 1d array -- tract centroid longitudes
+        nlat: 1d array -- tract centroid latitudes
+        windspeeds: 2d array -- (tracts x files) windspeeds in m/s, or a 1d array for one file
+        dat_header: list<str> -- a list of strings to be used as the header of the DAT files
+        compression: str -- also write a compressed copy of each DAT file, see write_dat_file
+        sidecar: str -- also write a columnar sidecar of each DAT file, see write_dat_file
+    """
+    windspeeds = np.asarray(windspeeds, dtype=float).reshape(len(ident), len(output_files))
+    for output_file, column in zip(output_files, windspeeds.T):
+        written = ~np.isnan(column)
+        if written.all():
+            write_dat_file(output_file, ident, elon, nlat, column, dat_header, compression=compression, sidecar=sidecar)
+        else:
+            write_dat_file(output_file, ident[written], elon[written], nlat[written], column[written], dat_header, compression=compression, sidecar=sidecar)
+
+def field_output_files(output_file, fields):
+    """ Names the DAT file of each field of a windgrid converted to many DAT files
+
+    Keyword arguments:
+        output_file: str -- file location and name the windgrid's DAT file would have
+        fields: list -- field names or band numbers
+
+    Returns:
+        output_files: list<str> -- output_file followed by _<field> for each field
+    """
+    stem = output_file[:-len('.dat')] if output_file.endswith('.dat') else output_file
+    return [f'{stem}_{field}.dat' for field in fields]
+
+def geodataframe_to_dat(gdf, output_file, dat_header=dat_header, wind_field=wind_field, neighbors=idw_neighbors, power=idw_power):
+    """ Creates a Hazus DAT file containing windspeeds in m/s from a windgrid geodataframe,
+    using the centroid of any geometry that is not a point
+
+    Keyword arguments:
+        gdf: geopandas.GeoDataFrame -- windgrid points or polygons
+        output_file: str -- file location and name of output DAT file
+        dat_header: list<str> -- a list of strings to be used as the header of the DAT file
+        wind_field: str -- the column name of the windspeeds in mph
+        neighbors: int -- number of nearest neighbors to weight
+        power: float -- power applied to the neighbor distances
+    """
+    xy = shapely.get_coordinates(shapely.centroid(np.asarray(gdf.geometry.values)))
+    z = np.asarray(gdf[wind_field], dtype=float)
+    points_to_dat(xy[:, 0], xy[:, 1], z, output_file, dat_header=dat_header, neighbors=neighbors, power=power)
+
+def points_to_dat(x, y, z, output_file, dat_header=dat_header, neighbors=idw_neighbors, power=idw_power, weight_cache=idw_weight_cache, selection=tract_selection, profile=None, writer=write_dat_files, defer=None, method=interpolation, max_distance=idw_max_distance, distance=idw_distance, crs=idw_crs):
+    """ Creates a Hazus DAT file containing windspeeds in m/s from windgrid point arrays -
+    a 2d z of many wind fields (ensemble members, percentiles) is interpolated with
+    one neighbor search and written to a DAT file per field
+
+    Keyword arguments:
+        x: 1d array -- point longitudes
+        y: 1d array -- point latitudes
+        z: 1d array -- point windspeeds in mph, or a 2d (points x fields) array
+        output_file: str -- file location and name of output DAT file, or a list with one per field of a 2d z
+        dat_header: list<str> -- a list of strings to be used as the header of the DAT file
+        neighbors: int -- number of nearest neighbors to weight
+        power: float -- power applied to the neighbor distances
+        weight_cache: str -- directory to reuse the tract selection and weights of windgrids on the same points from, None to always interpolate
+        selection: str -- 'polygon' or 'centroid', see tract_selection in config.py
+        profile: RunProfile -- records the stages and counts of the run, see profiling.run_profile
+        writer: function -- writes the DAT files, called like write_dat_files
+        defer: function -- defer(function, *args) runs the write later, None writes before returning
+        method: str -- 'idw', 'nearest' or 'bilinear', see interpolation in config.py
+        max_distance: float -- farthest a weighted point may be from a tract centroid, tracts with no
+            point in reach are not written (None for no limit)
+        distance: str -- 'degrees', 'sphere' or 'projected', see idw_distance in config.py
+        crs: str -- projected crs of 'projected' distances
+
+    Returns:
+        tracts_selection: 1d array -- cache positions of the tracts written
+        windspeeds: 1d array -- windspeeds in m/s of the tracts written (2d with a column per field if z is 2d)
+    """
+    if neighbors is None and max_distance is None:
+        raise ValueError('idw_max_distance must be set to weight every point within it')
+    profile = profile or RunProfile()
     # read data
-    tracts = gpd.read_file('db/tracts/tracts.shp')
+    with profile.stage('load_tracts'):
+        tracts = load_tracts()
+    xy = np.column_stack([x, y]).astype(float, copy=False)
+    z = np.asarray(z, dtype=float)
+    profile.count('input_points', len(z))
 
-    # select tracts
-    gdf['dissolve'] = 0
-    gdf_convex_hull = gdf.dissolve(by='dissolve').convex_hull
-    tracts_selection = tracts[tracts.geometry.intersects(gdf_convex_hull.geometry[0])]
-    tracts_selection = tracts_selection.reset_index()
+    if weight_cache is not None:
+        from weight_cache import cached_idw_weights
+
+        # select tracts and weight the points at their centroids, or load both from an earlier windgrid
+        with profile.stage('idw_weights'):
+            tracts_selection, weights = cached_idw_weights(
+                xy, tracts, neighbors=neighbors, power=power, selection=selection, cache_dir=weight_cache,
+                method=method, max_distance=max_distance, distance=distance, crs=crs
+            )
+            centroids = tracts.centroids[tracts_selection]
+        profile.count('tracts_selected', len(tracts_selection))
+        with profile.stage('idw'):
+            windspeeds_array = mph_to_mps(apply_weights(weights, z))
+    else:
+        # select tracts
+        with profile.stage('tract_selection'):
+            tracts_selection = select_tracts_in_hull(tracts, xy, selection=selection)
+            centroids = tracts.centroids[tracts_selection]
+        profile.count('tracts_selected', len(tracts_selection))
 
-    # calculate windspeeds
-    windspeeds_array = calculate_windspeeds_at_centroids(gdf, tracts_selection)
+        # calculate windspeeds
+        with profile.stage('idw'):
+            if method == 'idw' and max_distance is None and distance == 'degrees':
+                windspeeds_array = calculate_windspeeds_at_centroids(xy, z, centroids, neighbors=neighbors, power=power)
+            elif method == 'idw' and max_distance is None and distance == 'projected':
+                # projected coordinates are still 2d, so the tiled interpolation applies
+                windspeeds_array = calculate_windspeeds_at_centroids(
+                    search_coordinates(xy, distance, crs), z, tracts.search_centroids(distance, crs)[tracts_selection],
+                    neighbors=neighbors, power=power
+                )
+            else:
+                weights = tract_weights(
+                    xy, tracts, tracts_selection, method=method, neighbors=neighbors, power=power,
+                    max_distance=max_distance, distance=distance, crs=crs
+                )
+                windspeeds_array = mph_to_mps(apply_weights(weights, z))
 
-    # generate dat df
-    dat_df = generate_dat_df(windspeeds_array, tracts_selection)
+    # tracts with no point within max_distance are left out
+    reached = ~np.isnan(windspeeds_array).all(axis=tuple(range(1, windspeeds_array.ndim)))
+    if not reached.all():
+        tracts_selection, centroids, windspeeds_array = tracts_selection[reached], centroids[reached], windspeeds_array[reached]
 
     # write to .dat file
-    write_dat_file(output_file, dat_df, dat_header)
\ No newline at end of file
+    output_files = [output_file] if isinstance(output_file, str) else output_file
+    timed_write(profile, defer, writer, output_files, tracts.geoid[tracts_selection], centroids[:, 0], centroids[:, 1], windspeeds_array, dat_header)
+    profile.count('tracts_written', len(tracts_selection))
+    return tracts_selection, windspeeds_array
\ No newline at end of file
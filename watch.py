@@ -0,0 +1,88 @@
+import os
+from time import time, sleep
+from datetime import datetime
+from converters import list_conversions, load_settings, file_signature
+from utils import set_process_threads
+from incremental import is_up_to_date
+from batch import convert
+from tracts import load_tracts
+from config import watch_interval, watch_settle
+
+class Watcher:
+    """ Converts the windgrids that land in the input folder - a windgrid is
+    converted once its files have stopped changing for watch_settle seconds and
+    again whenever it is replaced. The tract cache, imports and formatted header
+    stay loaded between windgrids.
+    """
+    def __init__(self, settings=None, settle=watch_settle):
+        self.settings = settings or load_settings()
+        self.settle = settle
+        # input_file -> (signature, time it was first seen)
+        self.pending = {}
+        # input_file -> signature when it was converted
+        self.converted = {}
+        load_tracts()
+        set_process_threads(self.settings['tile_workers'])
+        os.makedirs(self.settings['output_dir'], exist_ok=True)
+
+    def scan(self):
+        """ Converts every windgrid in the input folder that is new or changed and has settled
+
+        Returns:
+            results: list<dict> -- results of the conversions run by this scan, see batch.convert
+        """
+        results = []
+        conversions = list_conversions(input_dir=self.settings['input_dir'], output_dir=self.settings['output_dir'])
+        for conversion in conversions:
+            converter, input_file, output_file = conversion
+            signature = file_signature(input_file)
+            if signature is None or self.converted.get(input_file) == signature:
+                continue
+            if input_file not in self.converted and self.is_up_to_date(conversion):
+                # converted before the watcher started
+                self.converted[input_file] = signature
+                continue
+            pending_signature, first_seen = self.pending.get(input_file, (None, None))
+            if pending_signature != signature:
+                self.pending[input_file] = (signature, time())
+                if self.settle > 0:
+                    continue
+            elif time() - first_seen < self.settle:
+                continue
+
+            result = convert(conversion, self.settings)
+            self.converted[input_file] = signature
+            del self.pending[input_file]
+            print_result(result)
+            results.append(result)
+        return results
+
+    def is_up_to_date(self, conversion):
+        """ Tests whether a windgrid was converted before the watcher started, see incremental.is_up_to_date """
+        try:
+            return is_up_to_date(conversion, self.settings)
+        except (OSError, ValueError):
+            # still being written, it is converted once it settles
+            return False
+
+    def run(self, interval=watch_interval):
+        """ Scans the input folder every interval seconds until interrupted
+
+        Keyword arguments:
+            interval: float -- seconds between scans
+        """
+        print(f"watching {self.settings['input_dir']} - press Ctrl+C to stop")
+        try:
+            while True:
+                self.scan()
+                sleep(interval)
+        except KeyboardInterrupt:
+            print('stopped watching')
+
+def print_result(result):
+    print(f"{datetime.now():%Y-%m-%d %H:%M:%S} {result['status']:9} {result['seconds']:8.2f}s  {result['input_file']} -> {result['output_file']}")
+    if result['error']:
+        print(result['error'])
+
+if __name__=='__main__':
+    Watcher().run()
@@ -0,0 +1,136 @@
+import os
+import json
+import hashlib
+import numpy as np
+from functools import lru_cache
+from utils import select_tracts_in_hull, idw_weights, thread_count, replace_atomically
+from config import idw_neighbors, idw_power, idw_max_distance, interpolation, idw_distance, idw_crs, tract_selection
+
+# bump when a change to the tract selection or weighting changes the weights
+weights_version = 1
+
+def grid_key(xy, neighbors, power, selection, tracts_version, method=interpolation, max_distance=idw_max_distance, distance=idw_distance, crs=idw_crs):
+    """ Hashes the point coordinates of a windgrid with everything else its weights depend on
+
+    Keyword arguments:
+        xy: 2d array -- x and y coordinates of the windgrid points as the columns
+        neighbors: int -- number of nearest neighbors to weight
+        power: float -- power applied to the neighbor distances
+        selection: str -- 'polygon' or 'centroid', see tract_selection in config.py
+        tracts_version: str -- see TractIndex.version
+        method: str -- 'idw', 'nearest' or 'bilinear', see interpolation in config.py
+        max_distance: float -- farthest a weighted point may be from the centroid, None for no limit
+        distance: str -- 'degrees', 'sphere' or 'projected', see idw_distance in config.py
+        crs: str -- projected crs of 'projected' distances
+
+    Returns:
+        key: str -- sha256 hex digest, the same for windgrids on the same points in the same order
+    """
+    digest = hashlib.sha256(np.ascontiguousarray(xy, dtype=float).tobytes())
+    digest.update(json.dumps({
+        'neighbors': neighbors,
+        'power': power,
+        'selection': selection,
+        'interpolation': method,
+        'max_distance': max_distance,
+        'distance': distance,
+        'crs': crs if distance == 'projected' else None,
+        'tracts_version': tracts_version,
+        'version': weights_version
+    }, sort_keys=True).encode())
+    return digest.hexdigest()
+
+def build_idw_weights(xy, centroids, neighbors=idw_neighbors, power=idw_power):
+    """ Builds the sparse matrix that interpolates point values at the centroids,
+    the same inverse distance weighting as idw_batch written as (centroids x points)
+
+    Keyword arguments:
+        xy: 2d array -- x and y coordinates of the windgrid points as the columns
+        centroids: 2d array -- x and y coordinates of the tract centroids as the columns
+        neighbors: int -- number of nearest neighbors to weight
+        power: float -- power applied to the neighbor distances
+
+    Returns:
+        weights: scipy.sparse.csr_matrix -- weights @ z interpolates z at the centroids
+    """
+    from scipy.spatial import cKDTree
+    from scipy.sparse import csr_matrix
+
+    k = min(neighbors, len(xy))
+    if len(centroids) == 0:
+        return csr_matrix((0, len(xy)))
+    distances, indicies = cKDTree(xy).query(centroids, k=k, workers=thread_count())
+    distances = distances.reshape(len(centroids), k)
+    indicies = indicies.reshape(len(centroids), k)
+    weights = idw_weights(distances, power=power)
+    return csr_matrix(
+        (weights.ravel(), indicies.ravel(), np.arange(0, weights.size + 1, k)),
+        shape=(len(centroids), len(xy))
+    )
+
+@lru_cache(maxsize=4)
+def load_idw_weights(weights_file):
+    """ Loads cached weights once per process
+
+    Keyword arguments:
+        weights_file: str -- file location of the cached weights
+
+    Returns:
+        tracts_selection: 1d array -- cache positions of the tracts the weights interpolate at
+        weights: scipy.sparse.csr_matrix -- (tracts x points) weights
+    """
+    from scipy.sparse import csr_matrix
+
+    with np.load(weights_file) as cached:
+        weights = csr_matrix((cached['data'], cached['indices'], cached['indptr']), shape=tuple(cached['shape']))
+        return cached['tracts'], weights
+
+def cached_idw_weights(xy, tracts, neighbors=idw_neighbors, power=idw_power, selection=tract_selection, cache_dir=None, method=interpolation, max_distance=idw_max_distance, distance=idw_distance, crs=idw_crs):
+    """ Selects the tracts covered by a windgrid and weights its points at their
+    centroids, reusing the result of any earlier windgrid on the same points - an
+    ensemble member or advisory on a known lattice only costs a sparse mat-vec
+
+    Keyword arguments:
+        xy: 2d array -- x and y coordinates of the windgrid points as the columns
+        tracts: TractIndex -- tracts to select from, see tracts.load_tracts
+        neighbors: int -- number of nearest neighbors to weight
+        power: float -- power applied to the neighbor distances
+        selection: str -- 'polygon' or 'centroid', see tract_selection in config.py
+        cache_dir: str -- directory the weights are saved to and loaded from
+        method: str -- 'idw', 'nearest' or 'bilinear', see interpolation in config.py
+        max_distance: float -- farthest a weighted point may be from the centroid, None for no limit
+        distance: str -- 'degrees', 'sphere' or 'projected', see idw_distance in config.py
+        crs: str -- projected crs of 'projected' distances
+
+    Returns:
+        tracts_selection: 1d array -- sorted cache positions of the selected tracts
+        weights: scipy.sparse.csr_matrix -- (tracts x points) weights
+    """
+    key = grid_key(
+        xy, neighbors, power, selection, tracts.version, method=method, max_distance=max_distance, distance=distance, crs=crs
+    )
+    weights_file = os.path.join(cache_dir, f'{key}.npz')
+    if os.path.isfile(weights_file):
+        return load_idw_weights(weights_file)
+
+    tracts_selection = select_tracts_in_hull(tracts, xy, selection=selection)
+    if method == 'idw' and max_distance is None and distance == 'degrees':
+        weights = build_idw_weights(xy, tracts.centroids[tracts_selection], neighbors=neighbors, power=power)
+    else:
+        from interpolation import tract_weights
+
+        weights = tract_weights(
+            xy, tracts, tracts_selection, method=method, neighbors=neighbors, power=power,
+            max_distance=max_distance, distance=distance, crs=crs
+        )
+    os.makedirs(cache_dir, exist_ok=True)
+
+    def write(temporary_file):
+        with open(temporary_file, 'wb') as file:
+            np.savez(
+                file, tracts=tracts_selection, data=weights.data, indices=weights.indices,
+                indptr=weights.indptr, shape=np.array(weights.shape)
+            )
+
+    replace_atomically(weights_file, write)
+    return tracts_selection, weights
\ No newline at end of file
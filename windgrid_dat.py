@@ -0,0 +1,172 @@
+import argparse
+import os
+import sys
+from converters import formats, load_settings, detect_conversion, list_conversions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='windgrid-dat',
+        description='Creates Hazus .dat files containing windspeeds in m/s from windgrids'
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    # config.py variables that can be set for a run
+    settings = argparse.ArgumentParser(add_help=False)
+    settings.add_argument('-o', '--output-dir', help='folder to write the .dat files to (default: output_dir)')
+    settings.add_argument('-c', '--config', help='JSON file of config.py variables to use for this run')
+    settings.add_argument('--header', action='append', dest='dat_header', help='a .dat header row, repeat for more rows')
+    settings.add_argument('--compress', choices=('gzip', 'zstd'), dest='dat_compression', help='also write a compressed copy of each .dat file')
+    settings.add_argument('--sidecar', choices=('parquet', 'npz'), dest='dat_sidecar', help='also write the columns of each .dat file to a sidecar file')
+    settings.add_argument('--latitude-field')
+    settings.add_argument('--longitude-field')
+    settings.add_argument('--wind-field', nargs='+', help="wind field, or many fields or glob patterns like 'member_*' to write a .dat file per field")
+    settings.add_argument('--idw-neighbors', type=int)
+    settings.add_argument('--idw-power', type=float)
+    settings.add_argument('--max-distance', type=float, dest='idw_max_distance', help='farthest a point may be from a tract centroid to be weighted, in degrees')
+    settings.add_argument('--interpolation', choices=('idw', 'nearest', 'bilinear'), help='how tract windspeeds are interpolated from points')
+    settings.add_argument('--distance', choices=('degrees', 'sphere', 'projected'), dest='idw_distance', help='how distances between points and tract centroids are measured')
+    settings.add_argument('--crs', dest='idw_crs', help="projected crs of --distance projected, eg. 'epsg:5070'")
+    settings.add_argument('--weight-cache', dest='idw_weight_cache', help='folder to reuse the interpolation weights of windgrids on the same points from')
+    settings.add_argument('--raster-method', choices=('zonal', 'zonal_inside', 'mask', 'nearest', 'bilinear'))
+    settings.add_argument('--bands', nargs='+', dest='raster_bands', help="raster bands to write a .dat file each for, or 'all'")
+    settings.add_argument('--tract-selection', choices=('polygon', 'centroid'), help='select tracts by polygon or by centroid')
+    settings.add_argument('-j', '--workers', type=int, dest='batch_workers', help='windgrids converted at the same time')
+    settings.add_argument('--threads', type=int, dest='tile_workers', help='threads each windgrid is converted with (default: the cpus shared between the workers)')
+    settings.add_argument('--profile', action='store_true', default=None, help='write the time and memory of each stage to <name>.profile.json')
+    settings.add_argument('--force', action='store_false', default=None, dest='incremental', help='convert windgrids even if their .dat file is up to date')
+    settings.add_argument('--cprofile', action='store_true', default=None, help='write a cProfile dump to <name>.prof')
+
+    convert = commands.add_parser('convert', parents=[settings], help='convert windgrid files or folders')
+    convert.add_argument('inputs', nargs='*', help='windgrid files or folders (default: input_dir)')
+    convert.add_argument('-f', '--format', choices=('auto',) + formats, default='auto', help='windgrid format (default: detected from the file name)')
+
+    watch = commands.add_parser('watch', parents=[settings], help='convert windgrids as they arrive in a folder')
+    watch.add_argument('input_dir', nargs='?', help='folder to watch (default: input_dir)')
+    watch.add_argument('--interval', type=float, help='seconds between checks of the folder (default: watch_interval)')
+    watch.add_argument('--settle', type=float, help='seconds a windgrid must stay unchanged before it is converted (default: watch_settle)')
+    pack = commands.add_parser('pack', parents=[settings], help='convert windgrids to a binary form that is read without parsing')
+    pack.add_argument('inputs', nargs='*', help='windgrid files or folders (default: input_dir)')
+    pack.description = 'Writes point windgrids as .npy files and rasters as uncompressed GeoTIFFs to the output folder (default: packed_dir), which convert reads like any other windgrid'
+    compare = commands.add_parser('compare', help='compare .dat files or folders of .dat files')
+    compare.add_argument('dat_files', nargs='+', help='a base .dat file and the files to compare to it, or a base folder and a folder')
+    compare.add_argument('--tolerance', type=float, default=0.0, help='windspeed change in m/s that is not counted as a change (default: 0)')
+    compare.add_argument('--deltas', help='.csv file to write every tract\'s windspeeds and changes to')
+    return parser.parse_args(argv)
+
+def settings_from_args(args):
+    """ Builds the settings of a run from the command line arguments
+
+    Keyword arguments:
+        args: argparse.Namespace -- parsed arguments
+
+    Returns:
+        settings: dict -- see converters.load_settings
+    """
+    return load_settings(
+        args.config,
+        dat_header=args.dat_header,
+        dat_compression=args.dat_compression,
+        dat_sidecar=args.dat_sidecar,
+        latitude_field=args.latitude_field,
+        longitude_field=args.longitude_field,
+        # one field keeps the single .dat file name, more write a .dat file per field
+        wind_field=args.wind_field[0] if args.wind_field and len(args.wind_field) == 1 else args.wind_field,
+        idw_neighbors=args.idw_neighbors,
+        idw_power=args.idw_power,
+        idw_max_distance=args.idw_max_distance,
+        interpolation=args.interpolation,
+        idw_distance=args.idw_distance,
+        idw_crs=args.idw_crs,
+        idw_weight_cache=args.idw_weight_cache,
+        raster_method=args.raster_method,
+        raster_bands=args.raster_bands,
+        tract_selection=args.tract_selection,
+        input_dir=getattr(args, 'input_dir', None),
+        output_dir=args.output_dir,
+        batch_workers=args.batch_workers,
+        tile_workers=args.tile_workers,
+        profile=args.profile,
+        cprofile=args.cprofile,
+        incremental=args.incremental
+    )
+
+def find_conversions(inputs, settings, formats=formats):
+    """ Lists the conversions of the given windgrid files and folders
+
+    Keyword arguments:
+        inputs: list<str> -- windgrid files or folders, input_dir if empty
+        settings: dict -- settings of the run, see converters.load_settings
+        formats: tuple<str> -- windgrid formats to include
+
+    Returns:
+        conversions: list<tuple> -- (converter, input_file, output_file) of each windgrid
+    """
+    conversions = []
+    for path in inputs or [settings['input_dir']]:
+        # ArcGrids are folders, so a folder is only searched if it is not an ArcGrid itself
+        if os.path.isdir(path) and not os.path.isfile(os.path.join(path, 'hdr.adf')):
+            conversions += list_conversions(formats, path, settings['output_dir'])
+            continue
+        conversion = detect_conversion(path, settings['output_dir'], formats)
+        if conversion is None:
+            raise ValueError(f'{path} is not a supported windgrid')
+        conversions.append(conversion)
+    return conversions
+
+def main(argv=None):
+    """ Runs the windgrid-dat command line, returning the exit code
+    """
+    args = parse_args(argv)
+    if args.command == 'convert':
+        from batch import run_batch, print_summary
+
+        settings = settings_from_args(args)
+        formats_used = formats if args.format == 'auto' else (args.format,)
+        conversions = find_conversions(args.inputs, settings, formats_used)
+        if not conversions:
+            print('no windgrids found')
+            return 1
+        os.makedirs(settings['output_dir'], exist_ok=True)
+        results = run_batch(conversions, settings)
+        print_summary(results)
+        return 1 if any(x['error'] for x in results) else 0
+    elif args.command == 'pack':
+        from packed import pack_windgrid
+        from config import packed_dir
+
+        settings = settings_from_args(args)
+        output_dir = args.output_dir or packed_dir
+        conversions = find_conversions(args.inputs, settings)
+        if not conversions:
+            print('no windgrids found')
+            return 1
+        failed = 0
+        for converter, input_file, output_file in conversions:
+            try:
+                print(f'{input_file} -> {pack_windgrid(input_file, output_dir, settings)}')
+            except Exception as e:
+                print(f'{input_file} failed: {e}')
+                failed += 1
+        return 1 if failed else 0
+    elif args.command == 'compare':
+        from compare import compare_dat_files, compare_folders, print_comparison
+
+        if len(args.dat_files) == 2 and all(os.path.isdir(x) for x in args.dat_files):
+            summaries = compare_folders(*args.dat_files, tolerance=args.tolerance)
+        else:
+            summaries = compare_dat_files(args.dat_files, tolerance=args.tolerance, deltas_file=args.deltas)
+        print_comparison(summaries)
+        # a regression check fails on any change
+        return 0 if all(x['matches'] for x in summaries) else 1
+    elif args.command == 'watch':
+        from watch import Watcher
+        from config import watch_interval, watch_settle
+
+        settings = settings_from_args(args)
+        settle = watch_settle if args.settle is None else args.settle
+        interval = watch_interval if args.interval is None else args.interval
+        Watcher(settings, settle=settle).run(interval=interval)
+        return 0
+
+if __name__=='__main__':
+    sys.exit(main())